@@ -23,6 +23,46 @@ ALLOWED_HOSTS = ["*"]
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GEOAPIFY_API_KEY = os.getenv("GEOAPIFY_API_KEY")
 
+# Upstream HTTP clients (health/http_client.py). Base URLs can point at
+# local stub servers; each upstream keeps a keep-alive pool, retries
+# failures to connect (and, for GETs, dropped connections) and 429/5xx
+# with jittered backoff, and opens its
+# circuit breaker after UPSTREAM_BREAKER_THRESHOLD consecutive failures
+# for UPSTREAM_BREAKER_RESET seconds.
+GROQ_API_BASE = os.getenv("GROQ_API_BASE", "https://api.groq.com")
+GEOAPIFY_API_BASE = os.getenv("GEOAPIFY_API_BASE", "https://api.geoapify.com")
+UPSTREAM_POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", "20"))
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "2"))
+UPSTREAM_RETRY_BACKOFF = float(os.getenv("UPSTREAM_RETRY_BACKOFF", "0.2"))
+UPSTREAM_BREAKER_THRESHOLD = int(os.getenv("UPSTREAM_BREAKER_THRESHOLD", "5"))
+UPSTREAM_BREAKER_RESET = float(os.getenv("UPSTREAM_BREAKER_RESET", "30"))
+
+# Bot reply cache for text-only messages, keyed by the normalized message
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+# Queued bot requests: with BOT_ASYNC_MODE (or "async": true per request)
+# /user/bot/ answers 202 and `manage.py run_bot_worker` does the work.
+# BOT_QUEUE_MAX_DEPTH pending jobs (0 = unlimited) sheds load with 503.
+BOT_ASYNC_MODE = os.getenv("BOT_ASYNC_MODE", "").lower() in ("1", "true", "yes")
+BOT_QUEUE_MAX_DEPTH = int(os.getenv("BOT_QUEUE_MAX_DEPTH", "0"))
+BOT_JOB_MAX_ATTEMPTS = int(os.getenv("BOT_JOB_MAX_ATTEMPTS", "3"))
+BOT_JOB_TIMEOUT = int(os.getenv("BOT_JOB_TIMEOUT", "300"))
+
+# Hospital lookup caches: geocoded addresses are kept indefinitely, hospital
+# lists per geohash cell (precision 5 is about 5 x 5 km) for
+# HOSPITAL_CACHE_TTL seconds. GEO_LRU_SIZE bounds the in-process LRUs.
+GEOHASH_PRECISION = int(os.getenv("GEOHASH_PRECISION", "5"))
+HOSPITAL_CACHE_TTL = int(os.getenv("HOSPITAL_CACHE_TTL", str(7 * 24 * 3600)))
+GEO_LRU_SIZE = int(os.getenv("GEO_LRU_SIZE", "4096"))
+
+# Local hospital dataset (`manage.py import_hospitals`): when the Hospital
+# table has rows, suggestions come from an in-memory index of it and
+# Geoapify is only asked when nothing lies within HOSPITAL_INDEX_MAX_KM of
+# the user. Workers notice a re-import within HOSPITAL_INDEX_REFRESH seconds.
+HOSPITAL_INDEX_MAX_KM = float(os.getenv("HOSPITAL_INDEX_MAX_KM", "50"))
+HOSPITAL_INDEX_REFRESH = float(os.getenv("HOSPITAL_INDEX_REFRESH", "300"))
+
 # Application definition
 INSTALLED_APPS = [
     "django.contrib.admin",
@@ -49,6 +89,7 @@ CORS_ALLOWED_ORIGINS = [
 CORS_ALLOW_CREDENTIALS = True
 
 MIDDLEWARE = [
+    "health.middleware.MetricsMiddleware",  # first, so it times everything below
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",  # must be before CommonMiddleware
@@ -79,15 +120,98 @@ TEMPLATES = [
 WSGI_APPLICATION = "HealthAssist.wsgi.application"
 
 # Database
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.postgresql",
-        "NAME": os.getenv("DB_NAME"),
-        "USER": os.getenv("DB_USER"),
-        "PASSWORD": os.getenv("DB_PASSWORD"),
-        "HOST": os.getenv("DB_HOST"),
-        "PORT": os.getenv("DB_PORT"),
+# Connections are reused across requests (CONN_MAX_AGE) with a liveness
+# check before reuse. DB_POOL=1 switches to psycopg 3's built-in pool
+# instead (Postgres only; requires psycopg[pool]). Setting DB_REPLICA_HOST
+# (or DB_REPLICA_NAME for SQLite) adds a "replica" alias that
+# health.db_routers.PrimaryReplicaRouter sends reads to.
+DB_ENGINE = os.getenv("DB_ENGINE", "django.db.backends.postgresql")
+DB_POOL = os.getenv("DB_POOL", "").lower() in ("1", "true", "yes")
+
+
+def database(prefix="DB_"):
+    config = {
+        "ENGINE": DB_ENGINE,
+        "NAME": os.getenv(f"{prefix}NAME", os.getenv("DB_NAME")),
+        "USER": os.getenv(f"{prefix}USER", os.getenv("DB_USER")),
+        "PASSWORD": os.getenv(f"{prefix}PASSWORD", os.getenv("DB_PASSWORD")),
+        "HOST": os.getenv(f"{prefix}HOST", os.getenv("DB_HOST")),
+        "PORT": os.getenv(f"{prefix}PORT", os.getenv("DB_PORT")),
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": True,
+    }
+    if DB_POOL and DB_ENGINE == "django.db.backends.postgresql":
+        from psycopg_pool import ConnectionPool
+
+        # The pool owns connection lifetime, so Django must not keep them
+        config["CONN_MAX_AGE"] = 0
+        config["OPTIONS"] = {
+            "pool": {
+                "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+                "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+                "timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+                "check": ConnectionPool.check_connection,
+            }
+        }
+    return config
+
+
+DATABASES = {"default": database()}
+
+if os.getenv("DB_REPLICA_HOST") or os.getenv("DB_REPLICA_NAME"):
+    DATABASES["replica"] = database("DB_REPLICA_")
+    DATABASES["replica"]["TEST"] = {"MIRROR": "default"}
+    DATABASE_ROUTERS = ["health.db_routers.PrimaryReplicaRouter"]
+
+# Cache: Redis when REDIS_URL is set (shared by all workers), else
+# per-process memory. With Redis, sessions are read through it and written
+# to the DB; a per-process cache would let each worker keep its own stale
+# copy of a session, so without Redis they come from the DB every time.
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "healthassist",
+        }
     }
+
+SESSION_ENGINE = (
+    "django.contrib.sessions.backends.cached_db" if os.getenv("REDIS_URL")
+    else "django.contrib.sessions.backends.db"
+)
+
+# Seconds a UserProfile stays cached (saves and deletes invalidate it).
+# Only with Redis: invalidation must reach every worker.
+PROFILE_CACHE_ENABLED = bool(os.getenv("REDIS_URL"))
+PROFILE_CACHE_TTL = int(os.getenv("PROFILE_CACHE_TTL", "300"))
+
+# Metrics at /metrics (Prometheus text format, per worker process).
+# METRICS_TRACE_SAMPLE_RATE of requests (0.0-1.0) also log their per-stage
+# timings to the "health.trace" logger. METRICS_AUTH_TOKEN, if set, is
+# required as a bearer token to scrape.
+METRICS_TRACE_SAMPLE_RATE = float(os.getenv("METRICS_TRACE_SAMPLE_RATE", "0"))
+METRICS_AUTH_TOKEN = os.getenv("METRICS_AUTH_TOKEN", "")
+
+# Application logs (upstream errors, sampled traces) go to stderr
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "plain": {"format": "%(asctime)s %(levelname)s %(name)s %(message)s"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "plain"},
+    },
+    "loggers": {
+        "health": {"handlers": ["console"], "level": os.getenv("LOG_LEVEL", "INFO"), "propagate": False},
+    },
 }
 
 # Password validation
@@ -104,6 +228,86 @@ TIME_ZONE = "UTC"
 USE_I18N = True
 USE_TZ = True
 
+# Skin model backend: "keras" (float32 .h5) or "tflite" (quantized model
+# from `manage.py convert_skin_model`, run by the LiteRT interpreter without
+# loading TensorFlow). Paths default to files in health/.
+# SKIN_TFLITE_NUM_THREADS caps the interpreter's CPU threads per worker
+# (unset: the interpreter's default).
+SKIN_MODEL_BACKEND = os.getenv("SKIN_MODEL_BACKEND", "keras")
+SKIN_MODEL_PATH = os.getenv("SKIN_MODEL_PATH")
+SKIN_TFLITE_MODEL_PATH = os.getenv("SKIN_TFLITE_MODEL_PATH")
+SKIN_TFLITE_NUM_THREADS = int(os.getenv("SKIN_TFLITE_NUM_THREADS", "0")) or None
+
+# Model registry: versioned model directories plus an ACTIVE pointer (see
+# health/model_registry.py and `manage.py skin_model_registry`). Workers
+# check ACTIVE every SKIN_MODEL_REGISTRY_POLL seconds and hot-swap to a new
+# version after warming it. Unset, the single model file above is served.
+SKIN_MODEL_REGISTRY_DIR = os.getenv("SKIN_MODEL_REGISTRY_DIR", "")
+SKIN_MODEL_REGISTRY_POLL = float(os.getenv("SKIN_MODEL_REGISTRY_POLL", "5"))
+
+# Shared inference server: with SKIN_INFERENCE_SOCKET set, workers send
+# preprocessed images to `manage.py run_inference_server` listening on that
+# unix socket instead of each loading the model. A call that gets no answer
+# within SKIN_INFERENCE_TIMEOUT seconds fails with 503. Each worker process
+# keeps at most SKIN_INFERENCE_CONNECTIONS connections (each with a shared
+# memory segment) and calls beyond that wait for a free one.
+SKIN_INFERENCE_SOCKET = os.getenv("SKIN_INFERENCE_SOCKET", "")
+SKIN_INFERENCE_TIMEOUT = float(os.getenv("SKIN_INFERENCE_TIMEOUT", "10"))
+SKIN_INFERENCE_CONNECTIONS = int(os.getenv("SKIN_INFERENCE_CONNECTIONS", "8"))
+
+# Skin model inference: concurrent requests are grouped into one forward
+# pass of up to SKIN_BATCH_MAX_SIZE images, waiting at most
+# SKIN_BATCH_MAX_WAIT_MS for the batch to fill.
+SKIN_BATCH_MAX_SIZE = int(os.getenv("SKIN_BATCH_MAX_SIZE", "16"))
+SKIN_BATCH_MAX_WAIT_MS = float(os.getenv("SKIN_BATCH_MAX_WAIT_MS", "5"))
+
+# Admission control for skin inference (health/admission.py), per worker:
+# at most SKIN_ADMISSION_MAX_CONCURRENCY predictions run at once and
+# SKIN_ADMISSION_MAX_QUEUE more wait up to SKIN_ADMISSION_QUEUE_TIMEOUT
+# seconds; anything beyond that gets 503 with Retry-After. 0 disables the
+# gate. A batch can only fill with requests that were admitted, so the
+# concurrency defaults to SKIN_BATCH_MAX_SIZE; set below it, batches never
+# grow past it. Each user (or client IP) may send SKIN_RATE_LIMIT_PER_MINUTE images
+# with bursts of SKIN_RATE_LIMIT_BURST before getting 429; 0 (the default)
+# disables it. Behind a reverse proxy, set TRUSTED_PROXY_COUNT to the number
+# of proxies that append to X-Forwarded-For so anonymous clients are told
+# apart by their own address rather than all sharing the proxy's.
+SKIN_ADMISSION_MAX_CONCURRENCY = int(os.getenv("SKIN_ADMISSION_MAX_CONCURRENCY", str(SKIN_BATCH_MAX_SIZE)))
+SKIN_ADMISSION_MAX_QUEUE = int(os.getenv("SKIN_ADMISSION_MAX_QUEUE", "32"))
+SKIN_ADMISSION_QUEUE_TIMEOUT = float(os.getenv("SKIN_ADMISSION_QUEUE_TIMEOUT", "5"))
+SKIN_RATE_LIMIT_PER_MINUTE = int(os.getenv("SKIN_RATE_LIMIT_PER_MINUTE", "0"))
+SKIN_RATE_LIMIT_BURST = int(os.getenv("SKIN_RATE_LIMIT_BURST", "10"))
+TRUSTED_PROXY_COUNT = int(os.getenv("TRUSTED_PROXY_COUNT", "0"))
+
+# Upper bound on images accepted by /user/skin/batch/ in one request
+SKIN_BATCH_MAX_IMAGES = int(os.getenv("SKIN_BATCH_MAX_IMAGES", "32"))
+
+# Skin prediction cache, keyed by upload SHA-256 (and optionally a
+# perceptual hash for near-duplicates). Backend "local" is an in-process
+# LRU; "django" uses the SKIN_CACHE_ALIAS entry of CACHES.
+SKIN_CACHE_BACKEND = os.getenv("SKIN_CACHE_BACKEND", "local")
+SKIN_CACHE_ALIAS = os.getenv("SKIN_CACHE_ALIAS", "default")
+SKIN_CACHE_MAX_ENTRIES = int(os.getenv("SKIN_CACHE_MAX_ENTRIES", "2048"))
+SKIN_CACHE_TTL = int(os.getenv("SKIN_CACHE_TTL", "3600"))
+SKIN_CACHE_PERCEPTUAL = os.getenv("SKIN_CACHE_PERCEPTUAL", "").lower() in ("1", "true", "yes")
+
+# Load and warm the skin model when each worker starts rather than on its
+# first request. Not safe with gunicorn --preload: TensorFlow hangs in
+# workers forked from a process that already initialised it.
+SKIN_MODEL_EAGER_LOAD = os.getenv("SKIN_MODEL_EAGER_LOAD", "").lower() in ("1", "true", "yes")
+
+# Uploaded images are stored once per content hash (health/image_store.py),
+# as a JPEG no larger than IMAGE_ORIGINAL_MAX_SIDE px on the long side.
+# IMAGE_VARIANT_WORKERS background threads per process build each image's
+# thumbnail (IMAGE_THUMBNAIL_SIZE px on the long side) and model-input copy.
+IMAGE_VARIANT_WORKERS = int(os.getenv("IMAGE_VARIANT_WORKERS", "2"))
+IMAGE_THUMBNAIL_SIZE = int(os.getenv("IMAGE_THUMBNAIL_SIZE", "256"))
+IMAGE_ORIGINAL_MAX_SIDE = int(os.getenv("IMAGE_ORIGINAL_MAX_SIDE", "512"))
+
+# Rows fetched per database round trip by the health record export
+# (/user/export/ and `manage.py export_records`)
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "2000"))
+
 # Media files
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
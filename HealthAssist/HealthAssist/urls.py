@@ -1,16 +1,43 @@
 
 from django.contrib import admin
 from django.urls import path,include
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
 
 
 def home(request):
     return JsonResponse({"status": "ok", "message": "Backend is running"})
 
+
+def ready(request):
+    # Readiness probe: in eager mode a worker only takes traffic once the
+    # skin model is warm; in lazy mode there is nothing to wait for.
+    from health.cnn_model import is_ready, warmup_error
+
+    if settings.SKIN_MODEL_EAGER_LOAD and not is_ready():
+        body = {"status": "warming_up"}
+        if warmup_error:
+            body = {"status": "error", "error": warmup_error}
+        return JsonResponse(body, status=503)
+    return JsonResponse({"status": "ready"})
+
+
+def metrics(request):
+    # Prometheus scrape endpoint for this worker; set METRICS_AUTH_TOKEN to
+    # require "Authorization: Bearer <token>".
+    from health.metrics import registry
+
+    token = settings.METRICS_AUTH_TOKEN
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponse(status=401)
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
     
 urlpatterns = [
     path('admin/', admin.site.urls),
       path('', home), 
+    path('ready', ready, name='ready'),
+    path('metrics', metrics, name='metrics'),
     path('user/',include('health.urls')),
     
 ]
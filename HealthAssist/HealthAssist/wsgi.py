@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'HealthAssist.settings')
 
 application = get_wsgi_application()
+
+from health.apps import start_eager_warmup  # noqa: E402
+
+start_eager_warmup()
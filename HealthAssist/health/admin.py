@@ -1,8 +1,13 @@
 
 
 from django.contrib import admin
-from .models import UserProfile, HealthRecord
+from .models import UserProfile, HealthRecord, GeocodeCache, HospitalCache, BotJob, ImageAsset, Hospital
 
 admin.site.register(UserProfile)
 admin.site.register(HealthRecord)
+admin.site.register(GeocodeCache)
+admin.site.register(HospitalCache)
+admin.site.register(BotJob)
+admin.site.register(ImageAsset)
+admin.site.register(Hospital)
 # admin.site.register(SkinDisease)
\ No newline at end of file
@@ -0,0 +1,245 @@
+"""
+Admission control for skin inference.
+
+``AdmissionGate`` lets at most ``max_concurrency`` predictions run in a
+worker at once and parks up to ``max_queue`` more, first come first served.
+A request that finds the queue full, or waits longer than ``queue_timeout``
+for a slot, is turned away at once with ``Overloaded`` (503) rather than
+piling onto TensorFlow and dragging every request in the worker past its
+timeout. ``TokenBucketLimiter`` caps how fast one user can send images
+(``RateLimited``, 429).
+
+Both are per process, like the metrics: with several gunicorn workers the
+worker count multiplies the limits. Queue depth, in-flight count and
+rejections are on /metrics (``admission_*``) for autoscaling.
+"""
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from . import metrics
+
+admitted = metrics.counter(
+    "admission_admitted_total", "Requests let through an admission gate.", ["pool"]
+)
+rejected = metrics.counter(
+    "admission_rejected_total",
+    "Requests turned away: queue_full, queue_timeout or rate_limited.",
+    ["pool", "reason"],
+)
+wait_seconds = metrics.histogram(
+    "admission_wait_seconds", "Time admitted requests spent queued for a slot.", ["pool"]
+)
+
+# Bounds for the Retry-After hint, in seconds
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 30
+
+
+class Rejected(Exception):
+    status = 503
+
+    def __init__(self, message, retry_after=MIN_RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Overloaded(Rejected):
+    status = 503
+
+
+class RateLimited(Rejected):
+    status = 429
+
+
+def _clamp_retry_after(seconds):
+    return int(min(MAX_RETRY_AFTER, max(MIN_RETRY_AFTER, math.ceil(seconds))))
+
+
+class AdmissionGate:
+    """
+    Bounded concurrency plus a bounded FIFO wait queue. A released slot is
+    handed straight to the oldest waiter, so nobody can barge past the queue.
+    """
+
+    def __init__(self, name, max_concurrency, max_queue=0, queue_timeout=5.0):
+        self.name = name
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout = float(queue_timeout)
+        self.in_flight = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+        # Moving average of how long a slot is held, for Retry-After
+        self._hold_time = 0.0
+
+    @property
+    def queue_depth(self):
+        return len(self._waiters)
+
+    def retry_after(self):
+        """Rough seconds until the current backlog drains."""
+        backlog = len(self._waiters) + 1
+        return _clamp_retry_after(backlog * self._hold_time / self.max_concurrency)
+
+    def acquire(self):
+        start = time.perf_counter()
+        with self._lock:
+            if self.in_flight < self.max_concurrency and not self._waiters:
+                self.in_flight += 1
+                admitted.inc(pool=self.name)
+                wait_seconds.observe(0.0, pool=self.name)
+                return
+            if len(self._waiters) >= self.max_queue:
+                rejected.inc(pool=self.name, reason="queue_full")
+                raise Overloaded(f"{self.name} queue is full", self.retry_after())
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+
+        if not waiter.wait(self.queue_timeout):
+            with self._lock:
+                # release() may have handed us the slot just as we timed out
+                if not waiter.is_set():
+                    self._waiters.remove(waiter)
+                    rejected.inc(pool=self.name, reason="queue_timeout")
+                    raise Overloaded(f"Timed out waiting for {self.name}", self.retry_after())
+        admitted.inc(pool=self.name)
+        wait_seconds.observe(time.perf_counter() - start, pool=self.name)
+
+    def release(self, held=None):
+        with self._lock:
+            if held is not None:
+                self._hold_time = held if not self._hold_time else 0.8 * self._hold_time + 0.2 * held
+            if self._waiters:
+                # The slot passes to the oldest waiter; in_flight is unchanged
+                self._waiters.popleft().set()
+            else:
+                self.in_flight -= 1
+
+    @contextmanager
+    def admit(self):
+        self.acquire()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start)
+
+
+class TokenBucketLimiter:
+    """
+    Per-key token buckets: ``rate`` tokens per second refill up to
+    ``burst``, and each request spends ``cost`` of them.
+    """
+
+    # Above this many keys, buckets that have refilled completely (idle
+    # clients) are dropped; a dropped bucket is indistinguishable from a new one.
+    max_keys = 10000
+
+    def __init__(self, name, rate, burst):
+        self.name = name
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def consume(self, key, cost=1):
+        """Spend ``cost`` tokens from ``key``'s bucket or raise RateLimited."""
+        # A request bigger than the bucket drains it rather than never passing
+        cost = min(cost, self.burst)
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < cost:
+                self._buckets[key] = (tokens, now)
+                rejected.inc(pool=self.name, reason="rate_limited")
+                wait = (cost - tokens) / self.rate
+                raise RateLimited("Too many requests", _clamp_retry_after(wait))
+            self._buckets[key] = (tokens - cost, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+
+    def _prune(self, now):
+        full = [
+            key for key, (tokens, updated) in self._buckets.items()
+            if tokens + (now - updated) * self.rate >= self.burst
+        ]
+        for key in full:
+            del self._buckets[key]
+
+
+# Global skin gate and rate limiter (lazy init, per process)
+skin_gate = None
+skin_limiter = None
+init_lock = threading.Lock()
+
+
+def get_skin_gate():
+    """The gate around skin inference, or None when SKIN_ADMISSION_MAX_CONCURRENCY is 0."""
+    global skin_gate
+    if skin_gate is None and getattr(settings, "SKIN_ADMISSION_MAX_CONCURRENCY", 0) > 0:
+        with init_lock:
+            if skin_gate is None:
+                skin_gate = AdmissionGate(
+                    "skin",
+                    settings.SKIN_ADMISSION_MAX_CONCURRENCY,
+                    max_queue=getattr(settings, "SKIN_ADMISSION_MAX_QUEUE", 0),
+                    queue_timeout=getattr(settings, "SKIN_ADMISSION_QUEUE_TIMEOUT", 5.0),
+                )
+    return skin_gate
+
+
+def get_skin_limiter():
+    """Per-user skin rate limiter, or None when SKIN_RATE_LIMIT_PER_MINUTE is 0."""
+    global skin_limiter
+    per_minute = getattr(settings, "SKIN_RATE_LIMIT_PER_MINUTE", 0)
+    if skin_limiter is None and per_minute > 0:
+        with init_lock:
+            if skin_limiter is None:
+                skin_limiter = TokenBucketLimiter(
+                    "skin", per_minute / 60.0, getattr(settings, "SKIN_RATE_LIMIT_BURST", per_minute)
+                )
+    return skin_limiter
+
+
+@contextmanager
+def skin_inference():
+    """Hold a skin gate slot (if the gate is enabled) for the enclosed block."""
+    gate = get_skin_gate()
+    if gate is None:
+        yield
+        return
+    with gate.admit():
+        yield
+
+
+def check_skin_rate(key, cost=1):
+    limiter = get_skin_limiter()
+    if limiter is not None:
+        limiter.consume(key, cost)
+
+
+def collect_admission_state():
+    gate = skin_gate
+    if gate is not None:
+        labels = {"pool": gate.name}
+        yield ("admission_in_flight", "gauge", "Requests holding an admission slot.", [(labels, gate.in_flight)])
+        yield ("admission_queue_depth", "gauge", "Requests waiting for an admission slot.", [(labels, gate.queue_depth)])
+        yield ("admission_concurrency_limit", "gauge", "Admission slots per worker.", [(labels, gate.max_concurrency)])
+        yield ("admission_queue_limit", "gauge", "Waiting requests allowed per worker.", [(labels, gate.max_queue)])
+    if skin_limiter is not None:
+        yield (
+            "rate_limiter_tracked_keys", "gauge", "Clients with a token bucket in this worker.",
+            [({"pool": skin_limiter.name}, len(skin_limiter))],
+        )
+
+
+metrics.add_collector(collect_admission_state)
@@ -1,6 +1,25 @@
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
+
+
+def start_eager_warmup():
+    """
+    Opt-in eager mode: load and warm the skin model in the background as the
+    worker starts, instead of on its first /user/skin/ request. /ready
+    reports 503 until this finishes. Called from wsgi.py and asgi.py, so only
+    web server processes load the model; management commands do not.
+    """
+    if getattr(settings, "SKIN_MODEL_EAGER_LOAD", False):
+        from .cnn_model import warmup
+
+        threading.Thread(target=warmup, name="skin-warmup", daemon=True).start()
 
 
 class HealthConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'health'
+
+    def ready(self):
+        from . import signals  # noqa: F401
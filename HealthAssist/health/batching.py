@@ -0,0 +1,111 @@
+"""
+Dynamic micro-batching for model inference.
+
+Concurrent callers submit one sample each; a background thread groups them
+into a batch of up to ``max_batch_size`` samples (or whatever arrived within
+``max_wait_ms`` of the first one), runs a single forward pass and hands each
+row of the output back to the caller that submitted it.
+
+With ``max_queue`` set, ``submit`` raises ``queue.Full`` instead of letting
+the backlog grow without bound. ``close`` lets the thread finish what is
+queued and exit; anything submitted afterwards runs inline.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+import numpy as np
+
+_STOP = object()
+
+
+class MicroBatcher:
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=5, name="batcher", max_queue=0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_queue = max(0, int(max_queue))
+        self.name = name
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._closed = False
+
+    def submit(self, sample):
+        """Queue one sample and return a Future resolving to its output row."""
+        future = Future()
+        with self._lock:
+            if not self._closed:
+                self._ensure_worker().put((sample, future), block=False)
+                return future
+        self._flush([(sample, future)])
+        return future
+
+    def predict(self, sample, timeout=None):
+        future = self.submit(sample)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            # Drop it from the queue if no batch has picked it up yet
+            future.cancel()
+            raise
+
+    def qsize(self):
+        return self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            if self._queue is not None and self._pid == os.getpid():
+                self._queue.put(_STOP)
+
+    def _ensure_worker(self):
+        # Called with self._lock held
+        pid = os.getpid()
+        # A queue or thread inherited through fork() (gunicorn --preload)
+        # is unusable in the child, so every process gets its own.
+        if self._pid != pid:
+            self._queue = queue.Queue(self.max_queue)
+            self._thread = None
+            self._pid = pid
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, args=(self._queue,), name=self.name, daemon=True
+            )
+            self._thread.start()
+        return self._queue
+
+    def _run(self, q):
+        while True:
+            item = q.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = q.get(timeout=remaining) if remaining > 0 else q.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self._flush(batch)
+                    return
+                batch.append(item)
+            self._flush(batch)
+
+    def _flush(self, batch):
+        batch = [(sample, future) for sample, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            outputs = self.predict_fn(np.stack([sample for sample, _ in batch]))
+        except Exception as exc:
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+        for (_, future), output in zip(batch, outputs):
+            future.set_result(output)
@@ -0,0 +1,65 @@
+"""
+Closed-loop load driver: ``concurrency`` clients each send requests back to
+back until ``requests`` have completed, then latency percentiles and
+throughput are reported.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_load(base_url, make_request, concurrency, total_requests):
+    """
+    ``make_request(i)`` returns ``(method, path, kwargs)`` for request ``i``.
+    Returns throughput, latency percentiles (ms) and the error count.
+    """
+    counter = iter(range(total_requests))
+    counter_lock = threading.Lock()
+    latencies, errors = [], []
+    local = threading.local()
+
+    def client():
+        local.session = requests.Session()
+        while True:
+            with counter_lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            method, path, kwargs = make_request(i)
+            start = time.perf_counter()
+            try:
+                response = local.session.request(method, base_url + path, timeout=120, **kwargs)
+                ok = response.status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = (time.perf_counter() - start) * 1000
+            latencies.append(elapsed)
+            if not ok:
+                errors.append(i)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput_rps": len(latencies) / wall if wall else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": latencies[-1] if latencies else None,
+    }
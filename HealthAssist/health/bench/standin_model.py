@@ -0,0 +1,21 @@
+"""
+A tiny deterministic Keras model with the skin model's interface (224x224x3
+in, 23-way softmax out), for benchmarking the inference path without the
+real weights.
+"""
+from health.cnn_model import CLASS_NAMES
+
+
+def build_standin_model(path, seed=0):
+    import keras
+
+    keras.utils.set_random_seed(seed)
+    model = keras.Sequential([
+        keras.Input((224, 224, 3)),
+        keras.layers.Conv2D(8, 3, strides=2, activation="relu"),
+        keras.layers.Conv2D(16, 3, strides=2, activation="relu"),
+        keras.layers.GlobalAveragePooling2D(),
+        keras.layers.Dense(len(CLASS_NAMES), activation="softmax"),
+    ])
+    model.save(path)
+    return path
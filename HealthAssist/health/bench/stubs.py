@@ -0,0 +1,99 @@
+"""
+Local stand-ins for the Groq and Geoapify APIs with configurable latency and
+error rate, so benchmarks never touch the network or spend API quota.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_REPLY = (
+    "1. Cause: most likely a common viral infection.\n"
+    "2. Home remedies: rest, fluids, warm salt-water gargles.\n"
+    "3. Safe OTC medicines: paracetamol as directed on the pack.\n"
+    "4. See a doctor if it lasts more than three days or gets worse."
+)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _delay_or_fail(self):
+        config = self.server.config
+        time.sleep(max(0.0, random.gauss(config["latency_ms"], config["jitter_ms"])) / 1000)
+        if random.random() < config["error_rate"]:
+            self._send_json({"error": "stub failure"}, status=503)
+            return True
+        return False
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if self._delay_or_fail():
+            return
+        if not payload.get("stream"):
+            self._send_json({"choices": [{"message": {"role": "assistant", "content": STUB_REPLY}}]})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for word in STUB_REPLY.split(" "):
+            event = {"choices": [{"delta": {"content": word + " "}}]}
+            self._send_chunk(f"data: {json.dumps(event)}\n\n".encode())
+        self._send_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self):
+        if self._delay_or_fail():
+            return
+        if self.path.startswith("/v1/geocode/search"):
+            self._send_json({"features": [{"geometry": {"coordinates": [80.0499, 15.5057]}}]})
+        else:
+            self._send_json({
+                "features": [
+                    {"properties": {
+                        "name": f"Stub Hospital {i}",
+                        "formatted": f"{i} Stub Road, Ongole",
+                        "lat": 15.5 + i / 100,
+                        "lon": 80.05 + i / 100,
+                    }}
+                    for i in range(5)
+                ]
+            })
+
+
+class StubServer(ThreadingHTTPServer):
+    """Serves both APIs; point GROQ_API_BASE and GEOAPIFY_API_BASE at ``url``."""
+
+    daemon_threads = True
+
+    def __init__(self, latency_ms=200, jitter_ms=20, error_rate=0.0, host="127.0.0.1", port=0):
+        super().__init__((host, port), StubHandler)
+        self.config = {"latency_ms": latency_ms, "jitter_ms": jitter_ms, "error_rate": error_rate}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="bench-stubs", daemon=True).start()
+        return self
@@ -1,14 +1,39 @@
+import hashlib
+import logging
 import os
+import threading
+import time
 import numpy as np
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing import image
+from django.conf import settings
+
+from . import admission, metrics, model_registry
+from .batching import MicroBatcher
+from .inference import RemoteBackend
+from .model_registry import Manifest
+from .preprocessing import image_to_array, load_image
 
 # Base directory
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_PATH = os.path.join(BASE_DIR, "skin_disease_model.h5")
+TFLITE_MODEL_PATH = os.path.join(BASE_DIR, "skin_disease_model.tflite")
+
+# Global model slot (lazy init); replaced wholesale on a hot swap
+slot = None
+slot_lock = threading.Lock()
+
+# Set once the model has served its first forward pass
+model_ready = threading.Event()
+warmup_error = None
+
+# Registry watcher thread and the pid it belongs to
+watcher = None
+watcher_pid = None
+
+logger = logging.getLogger(__name__)
 
-# Global model (lazy init)
-model = None
+batch_size = metrics.histogram(
+    "skin_batch_size", "Images per skin model forward pass.", buckets=(1, 2, 4, 8, 16, 32, 64)
+)
 
 # Class names (must match the trained model output)
 CLASS_NAMES = [
@@ -161,30 +186,313 @@ SKIN_INFO = {
   }
 }
 
+def file_version(path):
+    """Short fingerprint of a model file; changes whenever the file is replaced."""
+    st = os.stat(path)
+    key = f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
+    return hashlib.sha1(key.encode()).hexdigest()[:12]
+
+
+class KerasBackend:
+    """Full-precision float32 Keras model (the original ``.h5``)."""
+
+    name = "keras"
+
+    def __init__(self, path=None):
+        # Imported here, not at module level: loading TensorFlow costs seconds
+        # and hundreds of MB, which workers that never predict shouldn't pay.
+        from tensorflow.keras.models import load_model
+
+        self.path = path or MODEL_PATH
+        self.model = load_model(self.path)
+        self.version = file_version(self.path)
+
+    def predict(self, batch):
+        return np.asarray(self.model.predict_on_batch(batch))
+
+
+class TFLiteBackend:
+    """
+    Quantized (float16 or int8) TFLite model produced by
+    ``manage.py convert_skin_model``. Uses the standalone LiteRT /
+    tflite-runtime interpreter when installed, else the one bundled with
+    TensorFlow.
+    """
+
+    name = "tflite"
+
+    def __init__(self, path=None, num_threads=None):
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tflite_runtime.interpreter import Interpreter
+            except ImportError:
+                import tensorflow as tf
+
+                Interpreter = tf.lite.Interpreter
+
+        self.path = path or TFLITE_MODEL_PATH
+        self.version = file_version(self.path)
+        self.interpreter = Interpreter(model_path=self.path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.batch_size = int(self.input["shape"][0])
+        # An interpreter is not thread-safe; the batcher is its only caller
+        # in practice but warmup and parity checks may overlap with it.
+        self.lock = threading.Lock()
+
+    def predict(self, batch):
+        with self.lock:
+            if batch.shape[0] != self.batch_size:
+                self.interpreter.resize_tensor_input(self.input["index"], batch.shape)
+                self.interpreter.allocate_tensors()
+                self.batch_size = batch.shape[0]
+            self.interpreter.set_tensor(self.input["index"], _quantize(batch, self.input))
+            self.interpreter.invoke()
+            return _dequantize(self.interpreter.get_tensor(self.output["index"]), self.output)
+
+
+def _quantize(array, details):
+    scale, zero_point = details["quantization"]
+    if details["dtype"] == np.float32 or not scale:
+        return array.astype(details["dtype"])
+    info = np.iinfo(details["dtype"])
+    return np.clip(np.round(array / scale + zero_point), info.min, info.max).astype(details["dtype"])
+
+
+def _dequantize(array, details):
+    scale, zero_point = details["quantization"]
+    if details["dtype"] == np.float32 or not scale:
+        return array.astype(np.float32)
+    return (array.astype(np.float32) - zero_point) * scale
+
+
+BACKENDS = {
+    KerasBackend.name: KerasBackend,
+    TFLiteBackend.name: TFLiteBackend,
+    RemoteBackend.name: RemoteBackend,
+}
+
+
+def load_backend(name=None, path=None):
+    """
+    Instantiate the inference backend named in settings.SKIN_MODEL_BACKEND,
+    or the client of a shared inference server if SKIN_INFERENCE_SOCKET is set.
+    """
+    socket_path = getattr(settings, "SKIN_INFERENCE_SOCKET", "")
+    name = name or (RemoteBackend.name if socket_path else getattr(settings, "SKIN_MODEL_BACKEND", "keras"))
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown SKIN_MODEL_BACKEND {name!r}; choose from {sorted(BACKENDS)}")
+    if name == RemoteBackend.name:
+        return RemoteBackend(
+            path or socket_path,
+            timeout=getattr(settings, "SKIN_INFERENCE_TIMEOUT", 10.0),
+            max_connections=getattr(settings, "SKIN_INFERENCE_CONNECTIONS", 8),
+        )
+    if name == TFLiteBackend.name:
+        return TFLiteBackend(
+            path or default_model_path(name),
+            num_threads=getattr(settings, "SKIN_TFLITE_NUM_THREADS", None),
+        )
+    return BACKENDS[name](path or default_model_path(name))
+
+
+def default_model_path(name):
+    """The model file a local backend loads when no registry version names one."""
+    if name == TFLiteBackend.name:
+        return getattr(settings, "SKIN_TFLITE_MODEL_PATH", None) or TFLITE_MODEL_PATH
+    return getattr(settings, "SKIN_MODEL_PATH", None) or MODEL_PATH
+
+
+class ModelSlot:
+    """
+    One loaded model version: its backend, its labels and its own batcher.
+    A request holds on to the slot it started with, so a hot swap never
+    mixes versions within a request.
+    """
+
+    def __init__(self, manifest, backend):
+        self.manifest = manifest
+        self.backend = backend
+        self.batcher = None
+        if backend.name != RemoteBackend.name:
+            # The inference server batches across workers; batching here too
+            # would only add wait time.
+            self.batcher = MicroBatcher(
+                self._predict_batch,
+                max_batch_size=getattr(settings, "SKIN_BATCH_MAX_SIZE", 16),
+                max_wait_ms=getattr(settings, "SKIN_BATCH_MAX_WAIT_MS", 5),
+                name=f"skin-batcher-{self.version}",
+                max_queue=getattr(settings, "SKIN_BATCH_MAX_QUEUE", 0),
+            )
+
+    @property
+    def version(self):
+        # Registry versions are named; a bare model file is fingerprinted
+        if self.backend.name == RemoteBackend.name:
+            return self.backend.version
+        return self.manifest.version or f"{self.backend.name}-{self.backend.version}"
+
+    def _predict_batch(self, batch):
+        batch_size.observe(len(batch))
+        return self.backend.predict(batch)
+
+    def predict(self, sample):
+        """Output row for one image, and the version that produced it."""
+        if self.batcher is None:
+            preds, version = self.predict_many(sample[np.newaxis])
+            return preds[0], version
+        return self.batcher.predict(sample), self.version
+
+    def predict_many(self, batch):
+        if self.backend.name == RemoteBackend.name:
+            return self.backend.predict_versioned(batch)
+        return self._predict_batch(batch), self.version
+
+    def manifest_for(self, version):
+        """Labels for ``version`` (a remote server may have swapped already)."""
+        if version == self.manifest.version or self.backend.name != RemoteBackend.name:
+            return self.manifest
+        try:
+            return model_registry.get_manifest(version)
+        except model_registry.RegistryError:
+            return builtin_manifest()
+
+    def warm(self):
+        """Dummy forward pass so graph tracing happens before real traffic."""
+        self.predict_many(np.zeros((1, 224, 224, 3), dtype=np.float32))
+
+    def retire(self):
+        if self.batcher is not None:
+            self.batcher.close()
+
+
+def builtin_manifest():
+    """The labels in this module, for a model not served from the registry."""
+    return Manifest(None, CLASS_NAMES, SKIN_INFO)
+
+
+def load_slot(version=None):
+    """A slot for registry ``version``, or for the configured model file."""
+    if version is None or getattr(settings, "SKIN_INFERENCE_SOCKET", ""):
+        # Remote: labels follow whichever version the server reports
+        return ModelSlot(builtin_manifest(), load_backend())
+    manifest = model_registry.get_manifest(version)
+    return ModelSlot(manifest, load_backend(manifest.backend, manifest.model_path))
+
+
+def get_slot():
+    """The slot serving new requests (loaded on first use)."""
+    global slot
+    if slot is None:
+        with slot_lock:
+            if slot is None:
+                slot = load_slot(model_registry.active_version())
+    start_watcher()
+    return slot
+
+
 def get_model():
-    """Load model only once (lazy loading)."""
-    global model
-    if model is None:
-        model = load_model(MODEL_PATH)
-    return model
-
-
-def predict_skin_disease(img_path):
-    # Load and preprocess image
-    img = image.load_img(img_path, target_size=(224, 224))
-    img_array = image.img_to_array(img)
-    img_array = np.expand_dims(img_array, axis=0)
-    img_array = img_array / 255.0
-
-    # Get model and make prediction
-    model = get_model()
-    preds = model.predict(img_array)
-    idx = np.argmax(preds[0])
-    class_name = CLASS_NAMES[idx]
-    confidence = float(np.max(preds[0]) * 100)
+    """Backend of the current slot."""
+    return get_slot().backend
+
+
+def model_version():
+    """
+    Identifies the current model, e.g. for keying cached predictions.
+    Before the first prediction it comes from the registry's ACTIVE file or
+    the model file's fingerprint, the same names a slot would report,
+    without loading anything, so a cold worker answers cache hits at once.
+    Only a remote server's bare model file is unknown until the handshake.
+    """
+    current = slot
+    if current is not None:
+        return current.version
+    active = model_registry.active_version()
+    if active is not None:
+        return active
+    if getattr(settings, "SKIN_INFERENCE_SOCKET", ""):
+        return get_slot().version
+    name = getattr(settings, "SKIN_MODEL_BACKEND", "keras")
+    return f"{name}-{file_version(default_model_path(name))}"
+
+
+def swap_to(version):
+    """
+    Load ``version`` into a standby slot and warm it while the current slot
+    keeps serving, then switch new requests over. Requests already holding
+    the old slot finish on it; its batcher drains and stops.
+    """
+    global slot
+    standby = load_slot(version)
+    standby.warm()
+    with slot_lock:
+        old, slot = slot, standby
+    if old is not None:
+        old.retire()
+    model_ready.set()
+    logger.info("Skin model %s is now serving", standby.version)
+
+
+def watch_registry(interval):
+    failed = None
+    while True:
+        version = model_registry.active_version()
+        current = slot.manifest.version if slot is not None else None
+        if version and version != current and version != failed:
+            try:
+                swap_to(version)
+                failed = None
+            except Exception:
+                # Keep serving the old version; retry once ACTIVE changes again
+                logger.exception("Could not switch skin model to %s", version)
+                failed = version
+        time.sleep(interval)
+
+
+def start_watcher():
+    """Poll the registry's ACTIVE file from a background thread in this process."""
+    global watcher, watcher_pid
+    pid = os.getpid()
+    if watcher_pid == pid:
+        return
+    with slot_lock:
+        if watcher_pid == pid:
+            return
+        watcher_pid = pid
+        interval = getattr(settings, "SKIN_MODEL_REGISTRY_POLL", 5.0)
+        # Behind an inference server, the server does the swapping
+        if model_registry.registry_dir() and not getattr(settings, "SKIN_INFERENCE_SOCKET", "") and interval > 0:
+            watcher = threading.Thread(target=watch_registry, args=(interval,), name="skin-registry", daemon=True)
+            watcher.start()
+
+
+def warmup():
+    """Load the model and run a dummy forward pass so graph tracing happens now."""
+    global warmup_error
+    try:
+        get_slot().warm()
+        model_ready.set()
+    except Exception as e:
+        warmup_error = str(e)
+        raise
+
+
+def is_ready():
+    return model_ready.is_set()
+
+
+def describe_prediction(preds, manifest=None):
+    """Turn one row of model output into the API result."""
+    manifest = manifest or builtin_manifest()
+    idx = np.argmax(preds)
+    class_name = manifest.class_names[idx]
+    confidence = float(np.max(preds) * 100)
 
     # Get detailed info
-    info = SKIN_INFO.get(class_name, {})
+    info = manifest.skin_info.get(class_name, {})
     return {
         "class_name": class_name,
         "confidence": confidence,
@@ -193,3 +501,58 @@ def predict_skin_disease(img_path):
         "home_remedies": info.get("home_remedies", ""),
         "diet": info.get("diet", "")
     }
+
+
+def top_predictions(preds, k, manifest=None):
+    """The ``k`` most likely classes with their confidence in percent."""
+    class_names = (manifest or builtin_manifest()).class_names
+    return [
+        {"class_name": class_names[idx], "confidence": float(preds[idx] * 100)}
+        for idx in np.argsort(preds)[::-1][:k]
+    ]
+
+
+def predict_skin_disease(img, top_k=0):
+    # Decoding is as CPU-heavy as the forward pass, so both run under the
+    # admission gate (raises admission.Overloaded when it is saturated)
+    with admission.skin_inference():
+        # Decode and preprocess image (path or in-memory file)
+        with metrics.stage("skin.decode"):
+            decoded = load_image(img)
+        with metrics.stage("skin.preprocess"):
+            img_array = image_to_array(decoded)
+
+        # Queue for the next batched forward pass (includes waiting for the batch)
+        current = get_slot()
+        with metrics.stage("skin.inference"):
+            preds, version = current.predict(img_array)
+    model_ready.set()
+    with metrics.stage("skin.postprocess"):
+        manifest = current.manifest_for(version)
+        result = describe_prediction(preds, manifest)
+        if top_k:
+            result["top_predictions"] = top_predictions(preds, top_k, manifest)
+        result["model_version"] = version
+    return result
+
+
+def predict_skin_diseases(img_arrays):
+    """Predict a list of preprocessed images in a single forward pass."""
+    if not img_arrays:
+        return []
+    current = get_slot()
+    with metrics.stage("skin.inference"):
+        preds, version = current.predict_many(np.stack(img_arrays))
+    model_ready.set()
+    with metrics.stage("skin.postprocess"):
+        manifest = current.manifest_for(version)
+        return [dict(describe_prediction(row, manifest), model_version=version) for row in preds]
+
+
+def collect_model_state():
+    yield ("skin_model_ready", "gauge", "1 once the skin model has served a forward pass.", [({}, int(is_ready()))])
+    if slot is not None:
+        yield ("skin_model_info", "gauge", "The skin model version serving new requests.", [({"version": slot.version}, 1)])
+
+
+metrics.add_collector(collect_model_state)
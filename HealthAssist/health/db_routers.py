@@ -0,0 +1,33 @@
+"""
+Read/write splitting between the primary ("default") and a read replica
+("replica"), enabled in settings when DB_REPLICA_HOST is set.
+"""
+
+PRIMARY = "default"
+REPLICA = "replica"
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends reads (profile lookups, record history, cached geodata) to the
+    replica and every write to the primary. Sessions and the job queue
+    always use the primary: a session read right after login, or a job a
+    worker is claiming, must not come from a lagging replica.
+    """
+
+    primary_only = {("sessions", "session"), ("health", "botjob")}
+
+    def db_for_read(self, model, **hints):
+        if (model._meta.app_label, model._meta.model_name) in self.primary_only:
+            return PRIMARY
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
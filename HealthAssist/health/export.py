@@ -0,0 +1,165 @@
+"""
+Streaming export of HealthRecords with their user's profile fields.
+
+Rows are read with ``QuerySet.iterator(chunk_size=...)`` (a server-side
+cursor on PostgreSQL) and encoded one at a time, so memory stays flat
+however many records match. Used by /user/export/ and
+`manage.py export_records`. Under ASGI the view wraps the stream in
+``aiterate``, since Django would otherwise read a sync iterator into a list
+before sending it.
+"""
+import csv
+import json
+import zlib
+from datetime import datetime, time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import HealthRecord
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", ".ndjson"),
+    "csv": ("text/csv", ".csv"),
+}
+
+# (column, record -> value). The user's password is never exported.
+COLUMNS = [
+    ("id", lambda r: r.id),
+    ("created_at", lambda r: r.created_at.isoformat()),
+    ("message", lambda r: r.message),
+    ("bot_response", lambda r: r.bot_response),
+    ("image_sha256", lambda r: r.asset.sha256 if r.asset_id else None),
+    ("user_id", lambda r: r.user_id),
+    ("username", lambda r: r.user.username if r.user_id else None),
+    ("email", lambda r: r.user.email if r.user_id else None),
+    ("age", lambda r: r.user.age if r.user_id else None),
+    ("gender", lambda r: r.user.gender if r.user_id else None),
+    ("blood_group", lambda r: r.user.blood_group if r.user_id else None),
+    ("height", lambda r: r.user.height if r.user_id else None),
+    ("weight", lambda r: r.user.weight if r.user_id else None),
+    ("address", lambda r: r.user.address if r.user_id else None),
+]
+
+
+def parse_bound(value, end=False):
+    """
+    An aware datetime from an ISO date or datetime string. A bare date as
+    the end of a range means the end of that day, so ``until=2026-10-18``
+    includes records from the 18th.
+    """
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Not an ISO date or datetime: {value!r}")
+        moment = datetime.combine(day, time.max if end else time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def records(since=None, until=None):
+    """Records created in [since, until], oldest first."""
+    queryset = HealthRecord.objects.select_related("user", "asset").only(
+        "id", "created_at", "message", "bot_response", "user", "asset__sha256",
+        "user__username", "user__email", "user__age", "user__gender", "user__blood_group",
+        "user__height", "user__weight", "user__address",
+    ).order_by("created_at", "id")
+    if since:
+        queryset = queryset.filter(created_at__gte=since)
+    if until:
+        queryset = queryset.filter(created_at__lte=until)
+    return queryset
+
+
+def rows(queryset, chunk_size=None):
+    chunk_size = chunk_size or getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+    for record in queryset.iterator(chunk_size=chunk_size):
+        yield {name: value(record) for name, value in COLUMNS}
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+class _Line:
+    """File-like target for csv.writer that hands back what it was given."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow([name for name, _ in COLUMNS])
+    for row in rows:
+        yield writer.writerow(row.values())
+
+
+def encode(rows, fmt):
+    """UTF-8 chunks of ``rows`` in ``fmt`` ("ndjson" or "csv")."""
+    lines = ndjson_lines(rows) if fmt == "ndjson" else csv_lines(rows)
+    for line in lines:
+        yield line.encode("utf-8")
+
+
+def gzip_chunks(chunks, flush_bytes=1 << 16):
+    """
+    Gzip a stream of byte chunks on the fly, emitting roughly every
+    ``flush_bytes`` of input so the client sees steady progress.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    pending = 0
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        pending += len(chunk)
+        if pending >= flush_bytes:
+            out += compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def buffered(chunks, size=1 << 16):
+    """Join small chunks so each write to the socket is about ``size`` bytes."""
+    buffer, length = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield b"".join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def stream(queryset, fmt, compress=False, chunk_size=None):
+    """The export body as an iterator of byte chunks."""
+    chunks = encode(rows(queryset, chunk_size), fmt)
+    if compress:
+        return gzip_chunks(chunks)
+    return buffered(chunks)
+
+
+async def aiterate(chunks):
+    """
+    Async iterator over a sync ``stream``, fetching one chunk at a time in
+    the request's sync thread, where its database cursor lives.
+    """
+    next_chunk = sync_to_async(next)
+    try:
+        while True:
+            chunk = await next_chunk(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        # Releases the cursor if the client went away mid-export
+        await sync_to_async(chunks.close)()
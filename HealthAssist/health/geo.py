@@ -0,0 +1,72 @@
+"""
+Geo helpers: address normalization and geohash encoding for the
+geocode / nearby-hospital caches, and distances for the local hospital index.
+"""
+import hashlib
+import math
+import re
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+EARTH_RADIUS_KM = 6371.0088
+
+
+def normalize_address(address):
+    """Case-fold, drop punctuation and collapse whitespace: "Ongole , AP" -> "ongole ap"."""
+    address = re.sub(r"[^\w\s]", " ", address.casefold())
+    return " ".join(address.split())
+
+
+def address_key(address):
+    return hashlib.sha256(normalize_address(address).encode()).hexdigest()
+
+
+def map_link(lat, lon):
+    return f"https://www.google.com/maps/search/?api=1&query={lat},{lon}"
+
+
+def unit_vector(lat, lon):
+    """(x, y, z) on the unit sphere; straight-line distance between two grows with distance on the globe."""
+    lat, lon = math.radians(lat), math.radians(lon)
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+
+def km_to_chord(km):
+    return 2 * math.sin(min(math.pi, km / EARTH_RADIUS_KM) / 2)
+
+
+def geohash_encode(lat, lon, precision=5):
+    """Standard base-32 geohash; precision 5 is a cell of about 4.9 x 4.9 km."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+
+def geohash_center(geohash):
+    """(lat, lon) of the centre of a geohash cell."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (value >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
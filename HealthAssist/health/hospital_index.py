@@ -0,0 +1,178 @@
+"""
+In-memory nearest-hospital index over the Hospital table.
+
+Hospitals are placed on the unit sphere and held in a 3-d KD-tree, so a
+k-nearest query is a few dozen node visits (microseconds) and straight-line
+order matches great-circle order without any projection. ``locate`` maps an
+address to the centre of a city named in the dataset, which lets lookups
+work with no network at all.
+
+Each process builds the index on first use and rebuilds it when the table
+changes (checked every HOSPITAL_INDEX_REFRESH seconds).
+"""
+import heapq
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count, Max
+
+from . import metrics
+from .geo import km_to_chord, map_link, normalize_address, unit_vector
+from .models import Hospital
+
+# Same count Geoapify is asked for
+NEAREST_K = 5
+# Longest city name, in words, that ``locate`` looks for
+MAX_CITY_WORDS = 3
+
+
+class KDTree:
+    """Static KD-tree over 3-d points; nodes are (point index, axis, left, right)."""
+
+    def __init__(self, points):
+        self.points = points
+        self.root = self._build(list(range(len(points))), 0)
+
+    def _build(self, indices, depth):
+        if not indices:
+            return None
+        axis = depth % 3
+        indices.sort(key=lambda i: self.points[i][axis])
+        middle = len(indices) // 2
+        return (
+            indices[middle],
+            axis,
+            self._build(indices[:middle], depth + 1),
+            self._build(indices[middle + 1:], depth + 1),
+        )
+
+    def nearest(self, target, k, max_distance=float("inf")):
+        """``[(distance, index), ...]`` of up to ``k`` points within ``max_distance``, nearest first."""
+        best = []  # max-heap of (-squared distance, index)
+        limit = max_distance * max_distance
+        # (node, squared distance from target to the node's region, at least)
+        stack = [(self.root, 0.0)]
+        while stack:
+            node, floor = stack.pop()
+            if node is None or floor > (-best[0][0] if len(best) == k else limit):
+                continue
+            index, axis, left, right = node
+            point = self.points[index]
+            d2 = (
+                (point[0] - target[0]) ** 2
+                + (point[1] - target[1]) ** 2
+                + (point[2] - target[2]) ** 2
+            )
+            if d2 <= limit:
+                if len(best) < k:
+                    heapq.heappush(best, (-d2, index))
+                elif d2 < -best[0][0]:
+                    heapq.heapreplace(best, (-d2, index))
+            diff = target[axis] - point[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            # Far side pushed first so the near side is searched first
+            stack.append((far, max(floor, diff * diff)))
+            stack.append((near, floor))
+        return sorted(((-neg_d2) ** 0.5, index) for neg_d2, index in best)
+
+
+class HospitalIndex:
+    def __init__(self, rows, signature=None):
+        """``rows`` are ``(name, address, city, lat, lon)`` tuples."""
+        self.signature = signature
+        self.hospitals = []
+        points = []
+        city_points = {}
+        for name, address, city, lat, lon in rows:
+            self.hospitals.append({
+                "name": name or "Unnamed",
+                "address": address or "Address not available",
+                "lat": lat,
+                "lon": lon,
+                "map_link": map_link(lat, lon),
+            })
+            points.append(unit_vector(lat, lon))
+            if city:
+                city_points.setdefault(city, []).append((lat, lon))
+        self.tree = KDTree(points)
+        self.cities = {
+            city: (sum(lat for lat, _ in located) / len(located), sum(lon for _, lon in located) / len(located))
+            for city, located in city_points.items()
+        }
+
+    def __len__(self):
+        return len(self.hospitals)
+
+    def nearest(self, lat, lon, k=NEAREST_K, max_km=None):
+        """Up to ``k`` hospitals nearest to (lat, lon), shaped like Geoapify's, within ``max_km``."""
+        if max_km is None:
+            max_km = getattr(settings, "HOSPITAL_INDEX_MAX_KM", 50)
+        found = self.tree.nearest(unit_vector(lat, lon), k, km_to_chord(max_km))
+        return [self.hospitals[index] for _, index in found]
+
+    def locate(self, address):
+        """
+        (lat, lon) of a dataset city named in ``address``, or None. Later
+        and longer names win: in "12 Guntur Road, Ongole" it is Ongole.
+        """
+        words = normalize_address(address or "").split()
+        for end in range(len(words), 0, -1):
+            for size in range(min(MAX_CITY_WORDS, end), 0, -1):
+                location = self.cities.get(" ".join(words[end - size:end]))
+                if location:
+                    return location
+        return None
+
+
+# Global index (lazy init, per process)
+index = None
+checked_at = None
+index_lock = threading.Lock()
+
+
+def table_signature():
+    """Changes whenever hospitals are imported or removed."""
+    summary = Hospital.objects.aggregate(count=Count("id"), last=Max("imported_at"))
+    return summary["count"], summary["last"]
+
+
+def build_index(signature=None):
+    rows = Hospital.objects.order_by("id").values_list("name", "address", "city", "lat", "lon")
+    return HospitalIndex(rows.iterator(chunk_size=5000), signature)
+
+
+def needs_refresh():
+    return checked_at is None or time.monotonic() - checked_at >= getattr(settings, "HOSPITAL_INDEX_REFRESH", 300)
+
+
+def get_index():
+    """The current index, or None while the Hospital table is empty."""
+    global index, checked_at
+    if not needs_refresh():
+        return index
+    with index_lock:
+        if needs_refresh():
+            signature = table_signature()
+            if signature[0] == 0:
+                index = None
+            elif index is None or index.signature != signature:
+                index = build_index(signature)
+            checked_at = time.monotonic()
+    return index
+
+
+async def aget_index():
+    if not needs_refresh():
+        return index
+    # The refresh queries the DB: run it where Django manages the connection
+    return await sync_to_async(get_index)()
+
+
+def collect_index_size():
+    current = index
+    yield ("hospital_index_entries", "gauge", "Hospitals in this worker's local index.", [({}, len(current) if current else 0)])
+
+
+metrics.add_collector(collect_index_size)
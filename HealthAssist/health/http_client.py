@@ -0,0 +1,283 @@
+"""
+Shared HTTP clients for the upstream APIs the bot depends on (Groq and
+Geoapify).
+
+Each upstream gets one keep-alive connection pool per process (a
+``requests.Session`` for sync views, an ``httpx.AsyncClient`` per event loop
+for async ones, closed when its loop shuts down), a bounded number of retries with jittered exponential
+backoff for connection failures and 429/5xx responses, and a circuit breaker
+that fails fast with ``CircuitOpenError`` while the upstream is down.
+
+Base URLs come from settings (GROQ_API_BASE, GEOAPIFY_API_BASE), so the
+clients can be pointed at local stub servers.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from . import metrics
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+BREAKER_STATES = ("closed", "open", "half_open")
+
+upstream_duration = metrics.histogram(
+    "upstream_request_duration_seconds", "Latency of one attempt at an upstream call.", ["upstream"]
+)
+upstream_requests = metrics.counter(
+    "upstream_requests_total",
+    "Upstream call attempts by outcome: HTTP status, \"error\" or \"circuit_open\".",
+    ["upstream", "outcome"],
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+
+def _retryable(method, error):
+    """
+    Whether an attempt that raised ``error`` may be repeated. Failures to
+    connect always may: the request never left. Anything later (the
+    connection dropped after the body was sent) only for idempotent
+    methods, so a paid POST to Groq cannot run twice. A read timeout
+    already cost the caller the full timeout and is never retried.
+    """
+    if isinstance(error, (requests.ConnectTimeout, httpx.ConnectError, httpx.ConnectTimeout)):
+        return True
+    if isinstance(error, requests.ConnectionError):
+        # requests wraps urllib3's MaxRetryError, whose reason is the cause
+        cause = error.args[0] if error.args else None
+        if isinstance(getattr(cause, "reason", cause), NewConnectionError):
+            return True
+        return method.upper() in IDEMPOTENT_METHODS
+    if isinstance(error, httpx.RemoteProtocolError):
+        return method.upper() in IDEMPOTENT_METHODS
+    return False
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures. After
+    ``reset_timeout`` seconds one trial call is let through (half-open); its
+    outcome closes the breaker again or re-opens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class Upstream:
+    def __init__(self, name, base_url, pool_size=20, max_retries=2, backoff=0.2,
+                 failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._session = None
+        self._session_pid = None
+        self._session_lock = threading.Lock()
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def url(self, path):
+        return f"{self.base_url}{path}"
+
+    @property
+    def session(self):
+        # Pooled sockets must not be shared with a forked child
+        pid = os.getpid()
+        if self._session_pid != pid:
+            with self._session_lock:
+                if self._session_pid != pid:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session, self._session_pid = session, pid
+        return self._session
+
+    async def async_client(self):
+        # An httpx client is bound to the event loop it was first used on
+        loop = asyncio.get_running_loop()
+        entry = self._async_clients.get(loop)
+        if entry is None:
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            client = httpx.AsyncClient(limits=limits)
+            closer = self._close_with_loop(loop, client)
+            await closer.asend(None)
+            entry = self._async_clients[loop] = (client, closer)
+        return entry[0]
+
+    async def _close_with_loop(self, loop, client):
+        """
+        Parks at its first ``yield`` for the life of ``loop``. A loop that
+        shuts down (asyncio.run, and so each async_to_sync call under WSGI,
+        which gets a fresh loop) closes its open async generators first,
+        which closes ``client`` and its sockets instead of leaving them to GC.
+        """
+        try:
+            yield
+        finally:
+            self._async_clients.pop(loop, None)
+            await client.aclose()
+
+    def _delay(self, attempt):
+        # "Full jitter": uniform in [0, backoff * 2^attempt]
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            upstream_requests.inc(upstream=self.name, outcome="circuit_open")
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+    def _observe(self, start, outcome):
+        upstream_duration.observe(time.perf_counter() - start, upstream=self.name)
+        upstream_requests.inc(upstream=self.name, outcome=outcome)
+
+    def _record(self, response):
+        if response.status_code >= 500 or response.status_code == 429:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def request(self, method, path, **kwargs):
+        """
+        Blocking request. Raises CircuitOpenError without touching the
+        network while the breaker is open, else behaves like
+        ``requests.Session.request``.
+        """
+        self._check_breaker()
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, self.url(path), **kwargs)
+            except requests.RequestException as e:
+                self._observe(start, "error")
+                if not _retryable(method, e) or attempt >= self.max_retries:
+                    self.breaker.record_failure()
+                    raise
+            else:
+                self._observe(start, str(response.status_code))
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    self._record(response)
+                    return response
+                response.close()
+            time.sleep(self._delay(attempt))
+            attempt += 1
+
+    async def arequest(self, method, path, stream=False, **kwargs):
+        """
+        Async counterpart of ``request`` using httpx. With ``stream`` the
+        body is left unread, like ``requests``' ``stream=True``; the caller
+        must ``aclose()`` the response.
+        """
+        self._check_breaker()
+        client = await self.async_client()
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                response = await client.send(client.build_request(method, self.url(path), **kwargs), stream=stream)
+            except httpx.HTTPError as e:
+                self._observe(start, "error")
+                if not _retryable(method, e) or attempt >= self.max_retries:
+                    self.breaker.record_failure()
+                    raise
+            else:
+                self._observe(start, str(response.status_code))
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    self._record(response)
+                    return response
+                await response.aclose()
+            await asyncio.sleep(self._delay(attempt))
+            attempt += 1
+
+
+# Global upstreams (lazy init, keyed by name)
+upstreams = {}
+upstreams_lock = threading.Lock()
+
+
+def get_upstream(name):
+    """The shared client for ``"groq"`` or ``"geoapify"``."""
+    if name not in upstreams:
+        with upstreams_lock:
+            if name not in upstreams:
+                base_urls = {
+                    "groq": settings.GROQ_API_BASE,
+                    "geoapify": settings.GEOAPIFY_API_BASE,
+                }
+                upstreams[name] = Upstream(
+                    name,
+                    base_urls[name],
+                    pool_size=settings.UPSTREAM_POOL_SIZE,
+                    max_retries=settings.UPSTREAM_MAX_RETRIES,
+                    backoff=settings.UPSTREAM_RETRY_BACKOFF,
+                    failure_threshold=settings.UPSTREAM_BREAKER_THRESHOLD,
+                    reset_timeout=settings.UPSTREAM_BREAKER_RESET,
+                )
+    return upstreams[name]
+
+
+def collect_breaker_states():
+    yield (
+        "upstream_circuit_state",
+        "gauge",
+        "1 for the current circuit breaker state of each upstream.",
+        [
+            ({"upstream": name, "state": state}, int(upstream.breaker.state == state))
+            for name, upstream in list(upstreams.items())
+            for state in BREAKER_STATES
+        ],
+    )
+
+
+metrics.add_collector(collect_breaker_states)
@@ -0,0 +1,163 @@
+"""
+Content-addressed image storage.
+
+``store(upload)`` saves an upload once under the SHA-256 of its bytes and
+returns its ImageAsset; uploading the same photo again (from any user)
+reuses the existing file without decoding it. The stored "original" is a
+JPEG copy no larger than IMAGE_ORIGINAL_MAX_SIDE on the long side, the same
+bound records had before, so full-size camera photos are never kept.
+
+The model-input copy is the exact 224x224 RGB image the skin model's
+preprocessing produces from the upload itself, saved losslessly, so
+predicting from it gives the same result as predicting from the upload and
+may share its cache entry. It has to be made from the upload, before the
+bytes are gone, so ``store`` writes it during the request. Only the
+thumbnail is left to a small background pool once the transaction commits,
+or to `manage.py build_image_variants` for anything that pool missed.
+"""
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image
+
+from .models import ImageAsset
+from .preprocessing import downscaled_copy, load_image
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = ("original", "thumbnail", "model")
+CONTENT_TYPES = {"thumbnail": "image/jpeg", "model": "image/png"}
+
+# Global variant builder pool (lazy init)
+executor = None
+
+
+def get_executor():
+    global executor
+    if executor is None:
+        executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "IMAGE_VARIANT_WORKERS", 2), thread_name_prefix="image-variants"
+        )
+    return executor
+
+
+def content_hash(img):
+    """SHA-256 of an uploaded file (or a path) without reading it all into memory."""
+    digest = hashlib.sha256()
+    if isinstance(img, (str, os.PathLike)):
+        with open(img, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                digest.update(chunk)
+    else:
+        img.seek(0)
+        for chunk in img.chunks():
+            digest.update(chunk)
+        img.seek(0)
+    return digest.hexdigest()
+
+
+def store(upload, schedule=True):
+    """
+    The ImageAsset for ``upload``, saving the file if these bytes are new
+    and (with ``schedule``) queueing its variants. Raises
+    ``PIL.UnidentifiedImageError`` if it is not an image.
+    """
+    sha256 = content_hash(upload)
+    asset = ImageAsset.objects.using("default").filter(sha256=sha256).first()
+    if asset is not None:
+        return asset
+
+    original = downscaled_copy(upload, max_side=getattr(settings, "IMAGE_ORIGINAL_MAX_SIDE", 512))
+    with Image.open(original) as img:
+        width, height = img.size
+    original.seek(0)
+    model_input = model_input_copy(upload)
+
+    asset = ImageAsset(
+        sha256=sha256,
+        content_type="image/jpeg",
+        size=original.size,
+        width=width,
+        height=height,
+    )
+    asset.original.save(f"{sha256}.jpg", original, save=False)
+    asset.model_input.save(f"{sha256}_model.png", model_input, save=False)
+    try:
+        with transaction.atomic():
+            asset.save()
+    except IntegrityError:
+        # Another request stored the same bytes first
+        asset.original.delete(save=False)
+        asset.model_input.delete(save=False)
+        return ImageAsset.objects.using("default").get(sha256=sha256)
+    if schedule:
+        transaction.on_commit(lambda: schedule_variants(asset.pk))
+    return asset
+
+
+def model_input_copy(source):
+    """PNG of the preprocessed 224x224 image, as a ContentFile."""
+    buffer = io.BytesIO()
+    load_image(source).save(buffer, "PNG")
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return ContentFile(buffer.getvalue())
+
+
+def schedule_variants(asset_id):
+    get_executor().submit(_build_in_background, asset_id)
+
+
+def _build_in_background(asset_id):
+    close_old_connections()
+    try:
+        build_variants(ImageAsset.objects.using("default").get(pk=asset_id))
+    except Exception:
+        logger.exception("Could not build variants for image asset %s", asset_id)
+    finally:
+        close_old_connections()
+
+
+def build_variants(asset, rebuild=False):
+    """
+    Write the thumbnail of ``asset``, and its model-input copy if it has
+    none (assets stored before ``store`` wrote it, whose original is the
+    upload as sent). An existing model-input copy is never rebuilt: the
+    stored original is a lossy downscale, not what the upload decoded to.
+    """
+    if asset.variants_built_at and not rebuild:
+        return asset
+    max_side = getattr(settings, "IMAGE_THUMBNAIL_SIZE", 256)
+    copies = []
+    with asset.original.open("rb") as original:
+        copies.append((asset.thumbnail, downscaled_copy(original, max_side=max_side), "_thumb.jpg"))
+        if not asset.model_input:
+            copies.append((asset.model_input, model_input_copy(original), "_model.png"))
+
+    for field, data, suffix in copies:
+        if field:
+            field.delete(save=False)
+        field.save(f"{asset.sha256}{suffix}", data, save=False)
+    asset.variants_built_at = timezone.now()
+    asset.save(update_fields=["thumbnail", "model_input", "variants_built_at"])
+    return asset
+
+
+def variant_file(asset, variant):
+    """(file field, content type, is_variant) for serving; falls back to the original."""
+    field = {"thumbnail": asset.thumbnail, "model": asset.model_input}.get(variant)
+    if field:
+        return field, CONTENT_TYPES[variant], True
+    return asset.original, asset.content_type, variant == "original"
+
+
+def inference_file(asset):
+    """The cheapest file to run the skin model on: the model-input copy once built."""
+    return asset.model_input if asset.model_input else asset.original
@@ -0,0 +1,274 @@
+"""
+Out-of-process skin model inference.
+
+``manage.py run_inference_server`` loads the model once per node and
+listens on a unix socket. Web workers configured with SKIN_INFERENCE_SOCKET
+use ``RemoteBackend`` instead of loading TensorFlow and the weights
+themselves.
+
+Tensors do not travel through the socket. Each pooled client connection
+owns a shared-memory segment; a call writes its float32 batch there and
+sends only a small JSON header naming the segment. The server copies the batch out,
+feeds its rows to the batcher of its current model slot (so requests from
+different workers share forward passes) and writes the predictions back
+into the same segment, along with the version that produced them.
+
+Frames are a 4-byte big-endian length followed by a JSON object.
+"""
+import json
+import math
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+import weakref
+from concurrent.futures import TimeoutError
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+HEADER = struct.Struct(">I")
+MAX_FRAME = 1 << 20
+
+
+class InferenceUnavailable(Exception):
+    """The inference server is unreachable, overloaded or timed out."""
+
+
+def send_frame(sock, data):
+    payload = json.dumps(data).encode()
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exactly(sock, size):
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        buffer += chunk
+    return bytes(buffer)
+
+
+def recv_frame(sock):
+    (size,) = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+    if size > MAX_FRAME:
+        raise ConnectionError(f"frame of {size} bytes is too large")
+    return json.loads(_recv_exactly(sock, size))
+
+
+def attach_segment(name):
+    """
+    Open a segment created by another process. Before Python 3.13 attaching
+    also registers it with this process's resource tracker, which would
+    unlink it when we exit; the creator owns its lifetime, so undo that.
+    """
+    segment = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(segment._name, "shared_memory")
+    return segment
+
+
+class InferenceHandler(socketserver.BaseRequestHandler):
+    """One client connection: a sequence of predict requests over one segment."""
+
+    def setup(self):
+        self.segment = None
+
+    def handle(self):
+        send_frame(self.request, {"model": self.server.get_slot().version})
+        while True:
+            try:
+                message = recv_frame(self.request)
+            except (OSError, ValueError):
+                return
+            send_frame(self.request, self.predict(message))
+
+    def finish(self):
+        if self.segment is not None:
+            self.segment.close()
+
+    def predict(self, message):
+        try:
+            if self.segment is None or self.segment.name != message["segment"]:
+                if self.segment is not None:
+                    self.segment.close()
+                self.segment = attach_segment(message["segment"])
+            # Copy out so no view into the segment outlives this request
+            batch = np.array(np.ndarray(tuple(message["shape"]), dtype=np.float32, buffer=self.segment.buf))
+            # Every row goes to the same slot, even if a hot swap happens now
+            slot = self.server.get_slot()
+            futures = [slot.batcher.submit(sample) for sample in batch]
+        except queue.Full:
+            return {"error": "overloaded"}
+        except (KeyError, TypeError, ValueError, OSError) as e:
+            return {"error": f"bad request: {e}"}
+
+        try:
+            rows = [future.result(message.get("timeout")) for future in futures]
+        except TimeoutError:
+            for future in futures:
+                future.cancel()
+            return {"error": "timeout"}
+        except Exception as e:
+            return {"error": f"inference failed: {e}"}
+
+        output = np.stack(rows).astype(np.float32)
+        np.ndarray(output.shape, dtype=np.float32, buffer=self.segment.buf)[...] = output
+        return {"shape": list(output.shape), "model": slot.version}
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, get_slot):
+        # ``get_slot`` returns the cnn_model.ModelSlot serving new requests
+        self.get_slot = get_slot
+        if os.path.exists(path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except OSError:
+                os.unlink(path)  # stale socket from a server that died
+            else:
+                raise OSError(f"an inference server is already listening on {path}")
+            finally:
+                probe.close()
+        super().__init__(path, InferenceHandler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def _close_connections(connections, pid):
+    # Runs at exit (or when the backend is collected); a forked child must
+    # not unlink segments that belong to its parent
+    if os.getpid() != pid:
+        return
+    while connections:
+        _close_connection(connections.pop())
+
+
+def _close_connection(conn):
+    conn["sock"].close()
+    if conn["segment"] is not None:
+        conn["segment"].close()
+        conn["segment"].unlink()
+
+
+class RemoteBackend:
+    """
+    Client side: a skin model backend that forwards batches to
+    ``run_inference_server``. Calls borrow a connection, with its own
+    shared-memory segment, from a pool of at most ``max_connections`` per
+    process, so thread-per-request servers reuse a few segments instead of
+    leaving one behind per thread. The pool starts over after a fork, and a
+    connection whose call failed is closed and its segment unlinked.
+    """
+
+    name = "remote"
+
+    def __init__(self, path, timeout=10.0, max_connections=8):
+        self.path = path
+        self.timeout = timeout
+        self.max_connections = max(1, int(max_connections))
+        self._lock = threading.Condition()
+        self._reset_pool()
+        conn = self._checkout()
+        self.version = conn["model"]
+        self._checkin(conn)
+
+    def _reset_pool(self):
+        self._pid = os.getpid()
+        self._idle = []
+        self._open = 0
+        weakref.finalize(self, _close_connections, self._idle, self._pid)
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # A little longer than the server waits, so its timeout reply arrives
+        sock.settimeout(self.timeout + 1.0)
+        try:
+            sock.connect(self.path)
+            hello = recv_frame(sock)
+        except (OSError, ValueError) as e:
+            sock.close()
+            raise InferenceUnavailable(f"inference server at {self.path}: {e}") from e
+        return {"pid": os.getpid(), "sock": sock, "segment": None, "model": hello["model"]}
+
+    def _checkout(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset_pool()
+            deadline = time.monotonic() + self.timeout
+            while not self._idle and self._open >= self.max_connections:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise InferenceUnavailable(f"all {self.max_connections} inference connections are busy")
+                self._lock.wait(remaining)
+            if self._idle:
+                return self._idle.pop()
+            self._open += 1
+        try:
+            return self._connect()
+        except BaseException:
+            self._release_slot()
+            raise
+
+    def _checkin(self, conn):
+        with self._lock:
+            if conn["pid"] == self._pid:
+                self._idle.append(conn)
+                self._lock.notify()
+
+    def _discard(self, conn):
+        _close_connection(conn)
+        if conn["pid"] == os.getpid():
+            self._release_slot()
+
+    def _release_slot(self):
+        with self._lock:
+            self._open -= 1
+            self._lock.notify()
+
+    def _segment(self, conn, size):
+        segment = conn["segment"]
+        if segment is None or segment.size < size:
+            if segment is not None:
+                segment.close()
+                segment.unlink()
+                conn["segment"] = None
+            # Round up so batches of a similar size reuse the segment
+            segment = conn["segment"] = shared_memory.SharedMemory(create=True, size=1 << math.ceil(math.log2(size)))
+        return segment
+
+    def predict(self, batch):
+        return self.predict_versioned(batch)[0]
+
+    def predict_versioned(self, batch):
+        """Predictions and the server's model version that produced them."""
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        conn = self._checkout()
+        try:
+            segment = self._segment(conn, batch.nbytes)
+            np.ndarray(batch.shape, dtype=np.float32, buffer=segment.buf)[...] = batch
+            send_frame(conn["sock"], {"segment": segment.name, "shape": list(batch.shape), "timeout": self.timeout})
+            reply = recv_frame(conn["sock"])
+            if "error" not in reply:
+                output = np.ndarray(tuple(reply["shape"]), dtype=np.float32, buffer=segment.buf).copy()
+        except (OSError, ValueError) as e:
+            self._discard(conn)
+            raise InferenceUnavailable(f"inference server at {self.path}: {e}") from e
+        except BaseException:
+            self._discard(conn)
+            raise
+        # The server answered, so the connection is fine to reuse
+        self._checkin(conn)
+        if "error" in reply:
+            raise InferenceUnavailable(f"inference server: {reply['error']}")
+        self.version = reply["model"]
+        return output, reply["model"]
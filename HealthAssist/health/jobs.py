@@ -0,0 +1,92 @@
+"""
+DB-backed job queue for /user/bot/ requests.
+
+The web worker saves a HealthRecord without a reply plus a pending BotJob
+and returns 202; `manage.py run_bot_worker` claims jobs, calls Groq and
+Geoapify, and fills in the record. Claiming is a conditional UPDATE, so any
+number of worker threads and processes can share the table safely.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from . import image_store
+from .models import BotJob
+from .services import find_hospitals, get_bot_reply
+
+
+def enqueue(record, use_cache=True):
+    return BotJob.objects.create(record=record, use_cache=use_cache)
+
+
+def queue_depth():
+    return BotJob.objects.filter(status=BotJob.PENDING).count()
+
+
+def claim_job():
+    """Mark the oldest pending job as running and return it, or None."""
+    candidates = (
+        BotJob.objects.filter(status=BotJob.PENDING)
+        .order_by("created_at")
+        .values_list("id", flat=True)[:10]
+    )
+    for job_id in candidates:
+        claimed = BotJob.objects.filter(id=job_id, status=BotJob.PENDING).update(
+            status=BotJob.RUNNING, started_at=timezone.now()
+        )
+        if claimed:
+            job = BotJob.objects.select_related("record__user", "record__asset").get(id=job_id)
+            job.attempts += 1
+            job.save(update_fields=["attempts"])
+            return job
+    return None
+
+
+def requeue_stale():
+    """Put jobs back whose worker died mid-run (running longer than BOT_JOB_TIMEOUT)."""
+    cutoff = timezone.now() - timedelta(seconds=settings.BOT_JOB_TIMEOUT)
+    return BotJob.objects.filter(status=BotJob.RUNNING, started_at__lt=cutoff).update(status=BotJob.PENDING)
+
+
+def run_job(job):
+    record = job.record
+    try:
+        if record.asset:
+            # The 224x224 copy once built: no full-size decode in the worker
+            with image_store.inference_file(record.asset).open("rb") as image:
+                bot_reply = get_bot_reply(record.message, image, job.use_cache)
+        elif record.image:
+            with record.image.open("rb") as image:
+                bot_reply = get_bot_reply(record.message, image, job.use_cache)
+        else:
+            bot_reply = get_bot_reply(record.message, None, job.use_cache)
+        city_name = (record.user.address if record.user else "") or "Ongole"
+        hospitals = find_hospitals(city_name)
+    except Exception as e:
+        job.error = repr(e)
+        job.status = BotJob.FAILED if job.attempts >= settings.BOT_JOB_MAX_ATTEMPTS else BotJob.PENDING
+        job.save(update_fields=["error", "status"])
+        return job
+
+    record.bot_response = bot_reply
+    record.save(update_fields=["bot_response"])
+    job.status = BotJob.DONE
+    job.suggested_hospitals = hospitals
+    job.error = ""
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "suggested_hospitals", "error", "finished_at"])
+    return job
+
+
+def work(stop_event, poll_interval=1.0):
+    """Worker loop: process jobs until ``stop_event`` is set."""
+    while not stop_event.is_set():
+        close_old_connections()
+        job = claim_job()
+        if job is None:
+            stop_event.wait(poll_interval)
+            continue
+        run_job(job)
+    close_old_connections()
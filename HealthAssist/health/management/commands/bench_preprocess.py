@@ -0,0 +1,59 @@
+import statistics
+import time
+
+import numpy as np
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+
+from health.preprocessing import preprocess_image
+
+
+def legacy_preprocess(upload):
+    """The original view path: temp file in default_storage + keras load_img."""
+    from tensorflow.keras.preprocessing import image
+
+    path = default_storage.save(f"temp/{upload.name}", upload)
+    try:
+        img = image.load_img(default_storage.path(path), target_size=(224, 224))
+        return np.expand_dims(image.img_to_array(img), axis=0) / 255.0
+    finally:
+        default_storage.delete(path)
+
+
+def inmemory_preprocess(upload):
+    return np.expand_dims(preprocess_image(upload), axis=0)
+
+
+class Command(BaseCommand):
+    help = "Benchmark the legacy temp-file preprocessing against the in-memory draft decoder."
+
+    def add_arguments(self, parser):
+        parser.add_argument("image", help="Path to a sample image (e.g. a 12 MP phone JPEG)")
+        parser.add_argument("--iterations", type=int, default=20)
+
+    def handle(self, *args, **options):
+        with open(options["image"], "rb") as f:
+            data = f.read()
+        name = options["image"].rsplit("/", 1)[-1]
+
+        timings = {}
+        for label, fn in (("legacy", legacy_preprocess), ("in-memory", inmemory_preprocess)):
+            # One untimed run so imports and caches don't count
+            fn(SimpleUploadedFile(name, data))
+            samples = []
+            for _ in range(options["iterations"]):
+                upload = SimpleUploadedFile(name, data)
+                start = time.perf_counter()
+                fn(upload)
+                samples.append((time.perf_counter() - start) * 1000)
+            timings[label] = samples
+            samples.sort()
+            self.stdout.write(
+                f"{label:>10}: mean {statistics.mean(samples):8.2f} ms  "
+                f"p50 {samples[len(samples) // 2]:8.2f} ms  "
+                f"max {samples[-1]:8.2f} ms"
+            )
+
+        speedup = statistics.mean(timings["legacy"]) / statistics.mean(timings["in-memory"])
+        self.stdout.write(self.style.SUCCESS(f"in-memory path is {speedup:.1f}x faster"))
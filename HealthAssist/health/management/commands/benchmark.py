@@ -0,0 +1,200 @@
+import io
+import itertools
+import json
+import os
+import socket
+import subprocess
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from PIL import Image
+
+from health import cnn_model, http_client
+from health.bench.driver import run_load
+from health.bench.standin_model import build_standin_model
+from health.bench.stubs import StubServer
+from health.models import UserProfile
+
+BENCH_USER = {
+    "username": "bench-user",
+    "email": "bench-user@example.com",
+    "password": "bench-password",
+    "phone": "0000000000",
+    "address": "Ongole",
+    "age": 30,
+    "gender": "other",
+    "blood_group": "O+",
+    "height": 170.0,
+    "weight": 70.0,
+}
+
+
+class QuietHandler(WSGIRequestHandler):
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; without this, delayed
+        # ACKs add ~40 ms to every keep-alive request.
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def sample_jpeg(seed=0, size=(1600, 1200)):
+    """Deterministic photo-like JPEG: smooth gradients plus a little noise."""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    x, y = np.meshgrid(np.linspace(0, 255, width), np.linspace(0, 255, height))
+    pixels = np.stack([(x + y) / 2, x, y], axis=-1)
+    pixels += rng.normal(0, 8, pixels.shape)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels.clip(0, 255).astype(np.uint8)).save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test /user/bot/, /user/skin/ and /user/login/ against local Groq/Geoapify "
+        "stubs and report throughput and p50/p95/p99 per concurrency level. Writes to "
+        "the configured database (a 'bench-user' profile and its health records)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--endpoints", default="login,bot,skin", help="Comma-separated: login, bot, skin")
+        parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+        parser.add_argument("--requests", type=int, default=100, help="Requests per endpoint and level")
+        parser.add_argument("--base-url", help="Benchmark a running server instead of an in-process one")
+        parser.add_argument("--stub-latency-ms", type=float, default=200)
+        parser.add_argument("--stub-jitter-ms", type=float, default=20)
+        parser.add_argument("--stub-error-rate", type=float, default=0.0)
+        parser.add_argument("--real-model", action="store_true", help="Use the configured skin model, not the stand-in")
+        parser.add_argument("--warm-cache", action="store_true", help="Repeat inputs so the reply and prediction caches hit")
+        parser.add_argument("--output", help="Write results as JSON to this file")
+        parser.add_argument("--compare", help="Previous results JSON to compare against")
+
+    def handle(self, *args, **options):
+        endpoints = [e.strip() for e in options["endpoints"].split(",") if e.strip()]
+        unknown = set(endpoints) - {"login", "bot", "skin"}
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+        levels = [int(c) for c in options["concurrency"].split(",")]
+
+        stubs = StubServer(
+            options["stub_latency_ms"], options["stub_jitter_ms"], options["stub_error_rate"]
+        ).start()
+        base_url = options["base_url"] or self.start_server(stubs, options)
+
+        UserProfile.objects.filter(username=BENCH_USER["username"]).delete()
+        user = UserProfile.objects.create(**BENCH_USER)
+        images = [sample_jpeg(seed) for seed in range(8)]
+
+        def login(i):
+            return "POST", "/user/login/", {
+                "json": {"username": BENCH_USER["username"], "password": BENCH_USER["password"]}
+            }
+
+        # Unique across concurrency levels too, so later levels don't hit the
+        # reply cache warmed by earlier ones.
+        sequence = itertools.count()
+
+        def bot(i):
+            message = "fever and cough" if options["warm_cache"] else f"fever and cough case {next(sequence)}"
+            return "POST", "/user/bot/", {"json": {"user_id": user.id, "message": message}}
+
+        def skin(i):
+            data = images[i % len(images)]
+            if not options["warm_cache"]:
+                # Trailing bytes after the JPEG end marker give every request a
+                # distinct content hash without changing the decoded pixels.
+                data += next(sequence).to_bytes(4, "big")
+            return "POST", "/user/skin/", {"files": {"image": (f"bench-{i}.jpg", data, "image/jpeg")}}
+
+        builders = {"login": login, "bot": bot, "skin": skin}
+        results = []
+        for endpoint in endpoints:
+            # One untimed request so lazy loading doesn't count
+            run_load(base_url, builders[endpoint], 1, 1)
+            for concurrency in levels:
+                row = run_load(base_url, builders[endpoint], concurrency, options["requests"])
+                row["endpoint"] = endpoint
+                results.append(row)
+                self.stdout.write(
+                    f"{endpoint:<6} c={concurrency:<4} {row['throughput_rps']:8.1f} req/s  "
+                    f"p50 {row['p50_ms']:8.1f}  p95 {row['p95_ms']:8.1f}  p99 {row['p99_ms']:8.1f} ms  "
+                    f"errors {row['errors']}"
+                )
+
+        report = {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "options": {
+                k: options[k]
+                for k in ("requests", "stub_latency_ms", "stub_jitter_ms", "stub_error_rate", "real_model", "warm_cache")
+            },
+            "results": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        if options["compare"]:
+            self.compare(options["compare"], results)
+
+    def start_server(self, stubs, options):
+        """Serve the project in-process, wired to the stubs and the stand-in model."""
+        settings.GROQ_API_BASE = stubs.url
+        settings.GEOAPIFY_API_BASE = stubs.url
+        os.environ["GROQ_API_KEY"] = os.environ.get("GROQ_API_KEY") or "bench"
+        os.environ["GEOAPIFY_API_KEY"] = os.environ.get("GEOAPIFY_API_KEY") or "bench"
+        http_client.upstreams.clear()
+        # Every simulated user comes from one address: measure capacity, not
+        # the per-user rate limit
+        settings.SKIN_RATE_LIMIT_PER_MINUTE = 0
+
+        if not options["real_model"]:
+            path = os.path.join(tempfile.mkdtemp(prefix="skin-bench-"), "standin.h5")
+            settings.SKIN_MODEL_BACKEND = "keras"
+            settings.SKIN_MODEL_PATH = build_standin_model(path)
+            cnn_model.slot = None
+
+        server = ThreadedWSGIServer(("127.0.0.1", 0), QuietHandler)
+        server.set_app(get_wsgi_application())
+        threading.Thread(target=server.serve_forever, name="bench-server", daemon=True).start()
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    def compare(self, path, results):
+        with open(path) as f:
+            previous = json.load(f)
+        old = {(r["endpoint"], r["concurrency"]): r for r in previous["results"]}
+        self.stdout.write(f"\nCompared with {previous.get('commit') or path}:")
+        for row in results:
+            before = old.get((row["endpoint"], row["concurrency"]))
+            if not before:
+                continue
+            self.stdout.write(
+                f"{row['endpoint']:<6} c={row['concurrency']:<4} "
+                f"throughput {_change(before['throughput_rps'], row['throughput_rps'])}  "
+                f"p50 {_change(before['p50_ms'], row['p50_ms'])}  "
+                f"p99 {_change(before['p99_ms'], row['p99_ms'])}"
+            )
+
+
+def _change(before, after):
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before * 100:+6.1f}%"
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from PIL import UnidentifiedImageError
+
+from health import image_store
+from health.models import HealthRecord, ImageAsset
+
+
+class Command(BaseCommand):
+    help = (
+        "Build missing thumbnails (and model-input copies of older images) of stored "
+        "images, e.g. after a worker restarted before its background builds finished."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true", help="Rebuild thumbnails that already exist")
+        parser.add_argument("--limit", type=int, help="Stop after this many images")
+        parser.add_argument(
+            "--import-records", action="store_true",
+            help="First move HealthRecord.image files saved before content-addressed storage into ImageAssets",
+        )
+
+    def handle(self, *args, **options):
+        if options["import_records"]:
+            self.import_records()
+
+        assets = ImageAsset.objects.using("default").order_by("id")
+        if not options["rebuild"]:
+            assets = assets.filter(variants_built_at__isnull=True)
+        if options["limit"]:
+            assets = assets[:options["limit"]]
+
+        built = failed = 0
+        for asset in assets.iterator(chunk_size=100):
+            try:
+                image_store.build_variants(asset, rebuild=options["rebuild"])
+                built += 1
+            except (UnidentifiedImageError, OSError) as e:
+                failed += 1
+                self.stderr.write(f"{asset.sha256}: {e}")
+        self.stdout.write(self.style.SUCCESS(f"Built variants for {built} image(s), {failed} failed"))
+
+    def import_records(self):
+        records = HealthRecord.objects.using("default").filter(asset__isnull=True).exclude(image="").exclude(image=None)
+        imported = 0
+        for record in records.iterator(chunk_size=100):
+            try:
+                with record.image.open("rb") as image:
+                    record.asset = image_store.store(image, schedule=False)
+            except (UnidentifiedImageError, OSError) as e:
+                self.stderr.write(f"Record {record.pk}: {e}")
+                continue
+            record.save(update_fields=["asset"])
+            imported += 1
+        self.stdout.write(f"Imported {imported} record image(s)")
@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from health.cnn_model import MODEL_PATH, TFLITE_MODEL_PATH
+from health.preprocessing import preprocess_image
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def list_images(directory):
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(paths)
+
+
+class Command(BaseCommand):
+    help = "Convert the Keras skin model to a quantized TFLite model (float16 or int8)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--source", default=MODEL_PATH, help="Keras .h5 model to convert")
+        parser.add_argument("--output", default=TFLITE_MODEL_PATH)
+        parser.add_argument("--quantize", choices=["float16", "int8"], default="int8")
+        parser.add_argument(
+            "--calibration-dir",
+            help="Sample images for full-integer int8 calibration. Without it, "
+                 "int8 uses dynamic-range quantization (int8 weights, float activations).",
+        )
+        parser.add_argument("--calibration-samples", type=int, default=200)
+
+    def handle(self, *args, **options):
+        import tensorflow as tf
+        from tensorflow.keras.models import load_model
+
+        converter = tf.lite.TFLiteConverter.from_keras_model(load_model(options["source"]))
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+        if options["quantize"] == "float16":
+            converter.target_spec.supported_types = [tf.float16]
+        elif options["calibration_dir"]:
+            paths = list_images(options["calibration_dir"])[: options["calibration_samples"]]
+            if not paths:
+                raise CommandError(f"No images found in {options['calibration_dir']}")
+
+            def representative_dataset():
+                for path in paths:
+                    yield [np.expand_dims(preprocess_image(path), axis=0)]
+
+            # Input and output stay float32 so the backend needs no
+            # (de)quantization step at the edges.
+            converter.representative_dataset = representative_dataset
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+        tflite_model = converter.convert()
+        with open(options["output"], "wb") as f:
+            f.write(tflite_model)
+
+        source_mb = os.path.getsize(options["source"]) / 1e6
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {options['output']} ({len(tflite_model) / 1e6:.1f} MB, "
+            f"source {source_mb:.1f} MB). Check it with `manage.py skin_model_parity`."
+        ))
@@ -0,0 +1,48 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from health import export
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream health records with their user's profile fields to a file or stdout "
+        "as NDJSON or CSV. Memory use does not grow with the number of rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=list(export.FORMATS), default="ndjson")
+        parser.add_argument("--since", help="ISO date or datetime, inclusive")
+        parser.add_argument("--until", help="ISO date or datetime, inclusive (a date means the whole day)")
+        parser.add_argument("--output", "-o", default="-", help="File to write, or - for stdout")
+        parser.add_argument("--gzip", action="store_true", help="Gzip the output")
+        parser.add_argument("--chunk-size", type=int, help="Rows fetched per round trip (default EXPORT_CHUNK_SIZE)")
+        parser.add_argument("--database", help="Database alias to read from (default: the router's choice)")
+
+    def handle(self, *args, **options):
+        try:
+            since = export.parse_bound(options["since"])
+            until = export.parse_bound(options["until"], end=True)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        queryset = export.records(since, until)
+        if options["database"]:
+            queryset = queryset.using(options["database"])
+        chunks = export.stream(queryset, options["format"], compress=options["gzip"], chunk_size=options["chunk_size"])
+
+        to_stdout = options["output"] == "-"
+        out = sys.stdout.buffer if to_stdout else open(options["output"], "wb")
+        written = 0
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+                written += len(chunk)
+        finally:
+            if to_stdout:
+                out.flush()
+            else:
+                out.close()
+        if not to_stdout:
+            self.stderr.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output']}"))
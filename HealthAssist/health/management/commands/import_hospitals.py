@@ -0,0 +1,123 @@
+import csv
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from health import hospital_index
+from health.geo import normalize_address
+from health.models import Hospital
+
+# Accepted spellings of each column / GeoJSON property, first match wins
+ALIASES = {
+    "name": ("name", "hospital_name", "facility_name"),
+    "address": ("address", "formatted", "full_address", "addr:full"),
+    "city": ("city", "town", "district", "addr:city"),
+    "lat": ("lat", "latitude", "y"),
+    "lon": ("lon", "lng", "long", "longitude", "x"),
+    "external_id": ("id", "external_id", "osm_id", "@id"),
+}
+
+
+def pick(properties, field):
+    for key in ALIASES[field]:
+        value = properties.get(key)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def point_of(geometry):
+    """(lon, lat) of a Point, or the vertex average of a polygon's outer ring."""
+    kind, coordinates = geometry.get("type"), geometry.get("coordinates")
+    if kind == "Point":
+        return coordinates[:2]
+    if kind == "MultiPolygon":
+        kind, coordinates = "Polygon", coordinates[0]
+    if kind == "Polygon":
+        ring = coordinates[0]
+        return sum(p[0] for p in ring) / len(ring), sum(p[1] for p in ring) / len(ring)
+    return None
+
+
+def csv_rows(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            yield {key.strip().lower(): value for key, value in row.items() if key}
+
+
+def geojson_rows(path):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    for feature in data.get("features", []):
+        properties = dict(feature.get("properties") or {})
+        point = point_of(feature.get("geometry") or {})
+        if point is not None:
+            properties["lon"], properties["lat"] = point
+        if not pick(properties, "address"):
+            street = " ".join(
+                str(properties[key]) for key in ("addr:housenumber", "addr:street") if properties.get(key)
+            )
+            properties["address"] = ", ".join(part for part in (street, properties.get("addr:city")) if part)
+        yield properties
+
+
+class Command(BaseCommand):
+    help = (
+        "Load a hospital dataset (CSV with name/lat/lon columns, or GeoJSON features) "
+        "into the Hospital table used for offline nearby-hospital suggestions. "
+        "Re-importing a source replaces its rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=("csv", "geojson"), help="Defaults from the file extension")
+        parser.add_argument("--source", help="Name the rows are filed under (default: the file name)")
+        parser.add_argument("--default-city", default="", help="City for rows that have none")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.isfile(path):
+            raise CommandError(f"No such file: {path}")
+        fmt = options["format"] or ("geojson" if path.lower().endswith((".geojson", ".json")) else "csv")
+        source = options["source"] or os.path.basename(path)
+        rows = geojson_rows(path) if fmt == "geojson" else csv_rows(path)
+
+        now = timezone.now()
+        hospitals, skipped = [], 0
+        for row in rows:
+            try:
+                lat, lon = float(pick(row, "lat")), float(pick(row, "lon"))
+            except (TypeError, ValueError):
+                skipped += 1
+                continue
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                skipped += 1
+                continue
+            hospitals.append(Hospital(
+                name=str(pick(row, "name") or "Unnamed")[:255],
+                address=str(pick(row, "address") or ""),
+                city=normalize_address(str(pick(row, "city") or options["default_city"]))[:100],
+                lat=lat,
+                lon=lon,
+                source=source[:100],
+                external_id=str(pick(row, "external_id") or "")[:100],
+                imported_at=now,
+            ))
+        if not hospitals:
+            raise CommandError(f"No usable rows in {path} ({skipped} skipped)")
+
+        with transaction.atomic():
+            replaced, _ = Hospital.objects.filter(source=source).delete()
+            Hospital.objects.bulk_create(hospitals, batch_size=options["batch_size"])
+
+        # Build once here so a broken dataset fails now, not in a worker
+        index = hospital_index.build_index()
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {len(hospitals)} hospitals from {source} "
+            f"(replaced {replaced}, skipped {skipped}); index holds {len(index)} "
+            f"in {len(index.cities)} cities"
+        ))
@@ -0,0 +1,70 @@
+import os
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+# What a worker imports before it can serve its first request
+STARTUP_CODE = (
+    "import django; django.setup(); "
+    "from django.urls import get_resolver; get_resolver().url_patterns"
+)
+
+
+def parse_importtime(stderr):
+    """``(module, self_us, cumulative_us, depth)`` rows from ``-X importtime`` output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure worker cold start with `python -X importtime` in a fresh interpreter "
+        "and list the slowest imports."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--module", action="append", default=[],
+            help="Import this module instead of the project startup path (repeatable)",
+        )
+        parser.add_argument("--top", type=int, default=20, help="Rows to show")
+        parser.add_argument("--sort", choices=("cumulative", "self"), default="cumulative")
+        parser.add_argument(
+            "--budget", type=float,
+            help="Fail if total import time exceeds this many seconds (for CI)",
+        )
+
+    def handle(self, *args, **options):
+        if options["module"]:
+            code = "; ".join(f"import {module}" for module in options["module"])
+        else:
+            code = STARTUP_CODE
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            capture_output=True,
+            text=True,
+            env=os.environ.copy(),
+        )
+        if result.returncode:
+            raise CommandError(f"Import failed:\n{result.stderr[-2000:]}")
+
+        rows = parse_importtime(result.stderr)
+        total = sum(self_us for _, self_us, _, _ in rows) / 1e6
+        column = 1 if options["sort"] == "self" else 2
+        self.stdout.write(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for name, self_us, cumulative_us, depth in sorted(rows, key=lambda r: r[column], reverse=True)[:options["top"]]:
+            self.stdout.write(f"{cumulative_us / 1000:14.1f} {self_us / 1000:9.1f}  {name}")
+
+        heavy = [name for name in ("tensorflow", "keras") if any(row[0] == name for row in rows)]
+        self.stdout.write(f"\n{len(rows)} modules, {total:.2f} s total")
+        if heavy and not options["module"]:
+            self.stdout.write(self.style.WARNING(f"Startup imports {', '.join(heavy)}"))
+        if options["budget"] is not None and total > options["budget"]:
+            raise CommandError(f"Import time {total:.2f} s is over the {options['budget']:.2f} s budget")
@@ -0,0 +1,37 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from health import jobs
+
+
+class Command(BaseCommand):
+    help = "Process queued /user/bot/ jobs with a pool of worker threads."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=4, help="Jobs processed at once")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to wait when the queue is empty")
+
+    def handle(self, *args, **options):
+        requeued = jobs.requeue_stale()
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale job(s)")
+
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+        threads = [
+            threading.Thread(target=jobs.work, args=(stop, options["poll_interval"]), name=f"bot-worker-{i}")
+            for i in range(options["concurrency"])
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(self.style.SUCCESS(f"Bot worker running with {len(threads)} thread(s)"))
+
+        while not stop.is_set():
+            stop.wait(60)
+            jobs.requeue_stale()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,59 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from health import cnn_model
+from health.inference import InferenceServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve the skin model to every web worker on this node over a unix socket "
+        "(point SKIN_INFERENCE_SOCKET at it), so the model is loaded once instead of per worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--socket", default=settings.SKIN_INFERENCE_SOCKET, help="Unix socket path to listen on")
+        parser.add_argument(
+            "--backend", default=settings.SKIN_MODEL_BACKEND,
+            help="keras or tflite, for a model file outside the registry",
+        )
+        parser.add_argument("--max-batch-size", type=int, default=settings.SKIN_BATCH_MAX_SIZE)
+        parser.add_argument("--max-wait-ms", type=float, default=settings.SKIN_BATCH_MAX_WAIT_MS)
+        parser.add_argument("--max-queue", type=int, default=256, help="Images waiting for a batch before requests are refused")
+
+    def handle(self, *args, **options):
+        if not options["socket"]:
+            raise CommandError("Pass --socket or set SKIN_INFERENCE_SOCKET")
+        if options["backend"] == "remote":
+            raise CommandError("The inference server needs a local backend (keras or tflite)")
+
+        # This process serves the model itself: load it locally, and batch
+        # with this command's limits. It follows the registry's ACTIVE
+        # version and hot-swaps like a web worker would.
+        settings.SKIN_INFERENCE_SOCKET = ""
+        settings.SKIN_MODEL_BACKEND = options["backend"]
+        settings.SKIN_BATCH_MAX_SIZE = options["max_batch_size"]
+        settings.SKIN_BATCH_MAX_WAIT_MS = options["max_wait_ms"]
+        settings.SKIN_BATCH_MAX_QUEUE = options["max_queue"]
+        cnn_model.warmup()  # before taking traffic
+        version = cnn_model.model_version()
+
+        try:
+            server = InferenceServer(options["socket"], cnn_model.get_slot)
+        except OSError as e:
+            raise CommandError(str(e))
+
+        def stop(*_):
+            # shutdown() blocks until serve_forever returns, so not from its thread
+            threading.Thread(target=server.shutdown).start()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        self.stdout.write(self.style.SUCCESS(f"Serving {version} on {options['socket']}"))
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
@@ -0,0 +1,88 @@
+import json
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from health.cnn_model import CLASS_NAMES, load_backend
+from health.preprocessing import preprocess_image
+
+from .convert_skin_model import list_images
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare a candidate inference backend against the float32 Keras model: "
+        "top-1 agreement and confidence drift, overall and per class."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--images", help="Directory of sample images (recommended)")
+        parser.add_argument("--samples", type=int, default=64, help="Random inputs to use when --images is not given")
+        parser.add_argument("--reference", default="keras")
+        parser.add_argument("--candidate", default="tflite")
+        parser.add_argument("--candidate-path", help="Model file for the candidate backend")
+        parser.add_argument("--batch-size", type=int, default=16)
+        parser.add_argument("--min-agreement", type=float, default=0.0, help="Fail below this top-1 agreement (0-1)")
+        parser.add_argument("--json", dest="json_path", help="Also write the report to this file")
+
+    def handle(self, *args, **options):
+        if options["images"]:
+            paths = list_images(options["images"])
+            if not paths:
+                raise CommandError(f"No images found in {options['images']}")
+            inputs = np.stack([preprocess_image(p) for p in paths])
+        else:
+            rng = np.random.default_rng(0)
+            inputs = rng.random((options["samples"], 224, 224, 3), dtype=np.float32)
+
+        reference = load_backend(options["reference"])
+        candidate = load_backend(options["candidate"], options["candidate_path"])
+
+        ref_preds, cand_preds = [], []
+        for start in range(0, len(inputs), options["batch_size"]):
+            batch = inputs[start:start + options["batch_size"]]
+            ref_preds.append(reference.predict(batch))
+            cand_preds.append(candidate.predict(batch))
+        report = parity_report(np.concatenate(ref_preds), np.concatenate(cand_preds))
+
+        self.stdout.write(f"{'class':<26}{'n':>6}{'top-1 agree':>13}{'mean drift':>12}{'max drift':>11}")
+        for name, row in report["per_class"].items():
+            self.stdout.write(
+                f"{name:<26}{row['count']:>6}{row['agreement']:>13.3f}"
+                f"{row['mean_drift']:>12.2f}{row['max_drift']:>11.2f}"
+            )
+        self.stdout.write(
+            f"{'overall':<26}{report['count']:>6}{report['agreement']:>13.3f}"
+            f"{report['mean_drift']:>12.2f}{report['max_drift']:>11.2f}"
+        )
+        self.stdout.write("Drift is the change in the reference class's confidence, in percentage points.")
+
+        if options["json_path"]:
+            with open(options["json_path"], "w") as f:
+                json.dump(report, f, indent=2)
+
+        if report["agreement"] < options["min_agreement"]:
+            raise CommandError(
+                f"Top-1 agreement {report['agreement']:.3f} is below {options['min_agreement']:.3f}"
+            )
+
+
+def parity_report(ref_preds, cand_preds):
+    ref_top1 = ref_preds.argmax(axis=1)
+    cand_top1 = cand_preds.argmax(axis=1)
+    rows = np.arange(len(ref_preds))
+    drift = np.abs(ref_preds[rows, ref_top1] - cand_preds[rows, ref_top1]) * 100
+    agree = ref_top1 == cand_top1
+
+    def summary(mask):
+        count = int(mask.sum())
+        return {
+            "count": count,
+            "agreement": float(agree[mask].mean()) if count else 1.0,
+            "mean_drift": float(drift[mask].mean()) if count else 0.0,
+            "max_drift": float(drift[mask].max()) if count else 0.0,
+        }
+
+    report = summary(np.ones(len(ref_preds), dtype=bool))
+    report["per_class"] = {name: summary(ref_top1 == idx) for idx, name in enumerate(CLASS_NAMES)}
+    return report
@@ -0,0 +1,72 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from health import model_registry
+from health.cnn_model import CLASS_NAMES, SKIN_INFO
+
+
+class Command(BaseCommand):
+    help = (
+        "Manage the skin model registry (SKIN_MODEL_REGISTRY_DIR): list versions, "
+        "publish a model file as a new version, or activate a version. Workers "
+        "pick up the active version without a restart."
+    )
+
+    def add_arguments(self, parser):
+        sub = parser.add_subparsers(dest="action", required=True)
+
+        sub.add_parser("list", help="Show published versions")
+
+        publish = sub.add_parser("publish", help="Copy a model into the registry as a new version")
+        publish.add_argument("version")
+        publish.add_argument("model_file", help=".h5 (keras) or .tflite file")
+        publish.add_argument("--backend", choices=["keras", "tflite"], help="Defaults from the file extension")
+        publish.add_argument(
+            "--labels",
+            help='JSON file with "class_names" and "skin_info"; defaults to the labels built into cnn_model',
+        )
+        publish.add_argument("--activate", action="store_true", help="Make it the active version")
+
+        activate = sub.add_parser("activate", help="Point ACTIVE at a published version")
+        activate.add_argument("version")
+
+    def handle(self, *args, **options):
+        if not model_registry.registry_dir():
+            raise CommandError("Set SKIN_MODEL_REGISTRY_DIR first")
+        try:
+            getattr(self, options["action"])(options)
+        except model_registry.RegistryError as e:
+            raise CommandError(str(e))
+
+    def list(self, options):
+        active = model_registry.active_version()
+        for version in model_registry.list_versions():
+            manifest = model_registry.get_manifest(version)
+            marker = "*" if version == active else " "
+            self.stdout.write(
+                f"{marker} {version:<24} {manifest.backend:<7} {len(manifest.class_names)} classes  "
+                f"{os.path.basename(manifest.model_path)}"
+            )
+
+    def publish(self, options):
+        model_file = options["model_file"]
+        if not os.path.isfile(model_file):
+            raise CommandError(f"No such file: {model_file}")
+        backend = options["backend"] or ("tflite" if model_file.endswith(".tflite") else "keras")
+
+        class_names, skin_info = CLASS_NAMES, SKIN_INFO
+        if options["labels"]:
+            with open(options["labels"]) as f:
+                labels = json.load(f)
+            class_names, skin_info = labels["class_names"], labels.get("skin_info", {})
+
+        manifest = model_registry.publish(options["version"], model_file, backend, class_names, skin_info)
+        self.stdout.write(self.style.SUCCESS(f"Published {manifest.version} ({backend})"))
+        if options["activate"]:
+            self.activate(options)
+
+    def activate(self, options):
+        model_registry.activate(options["version"])
+        self.stdout.write(self.style.SUCCESS(f"{options['version']} is now active"))
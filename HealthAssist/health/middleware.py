@@ -0,0 +1,97 @@
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import BadRequest, PermissionDenied, SuspiciousOperation
+from django.http import Http404
+from django.http.multipartparser import MultiPartParserError
+
+from . import metrics
+
+trace_logger = logging.getLogger("health.trace")
+
+request_duration = metrics.histogram(
+    "http_request_duration_seconds", "Request latency by route.", ["method", "route", "status"]
+)
+request_exceptions = metrics.counter(
+    "http_request_exceptions_total", "Requests whose view raised an unhandled exception (answered 500).", ["method", "route"]
+)
+
+# Exceptions Django answers with a 4xx; not failures of the service
+CLIENT_ERRORS = (Http404, PermissionDenied, BadRequest, SuspiciousOperation, MultiPartParserError)
+
+
+def _route(request):
+    # The URL pattern, not the path, so /user/bot/jobs/<id>/ stays one series
+    match = getattr(request, "resolver_match", None)
+    return f"/{match.route}" if match and match.route else "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Records latency per route and status, and for a
+    METRICS_TRACE_SAMPLE_RATE fraction of requests logs one line to
+    ``health.trace`` with the time spent in each ``metrics.stage``. Django
+    turns a view's exception into a response before this middleware sees
+    it, so unhandled ones are counted in ``process_exception``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        start, token = self._begin()
+        try:
+            response = self.get_response(request)
+        finally:
+            trace = self._end(token)
+        self._record(request, response, start, trace)
+        return response
+
+    async def __acall__(self, request):
+        start, token = self._begin()
+        try:
+            response = await self.get_response(request)
+        finally:
+            trace = self._end(token)
+        self._record(request, response, start, trace)
+        return response
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, CLIENT_ERRORS):
+            request_exceptions.inc(method=request.method, route=_route(request))
+        # None: Django goes on to build its usual error response
+        return None
+
+    def _begin(self):
+        sampled = random.random() < settings.METRICS_TRACE_SAMPLE_RATE
+        return time.perf_counter(), metrics.current_trace.set({} if sampled else None)
+
+    def _end(self, token):
+        trace = metrics.current_trace.get()
+        metrics.current_trace.reset(token)
+        return trace
+
+    def _record(self, request, response, start, trace):
+        elapsed = time.perf_counter() - start
+        route = _route(request)
+        request_duration.observe(elapsed, method=request.method, route=route, status=response.status_code)
+        if trace is not None:
+            # Streaming responses are timed to the first byte only
+            trace_logger.info(json.dumps({
+                "method": request.method,
+                "route": route,
+                "status": response.status_code,
+                "duration_ms": round(elapsed * 1000, 1),
+                "stages_ms": {name: round(seconds * 1000, 1) for name, seconds in trace.items()},
+            }))
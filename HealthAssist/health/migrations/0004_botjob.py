@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health', '0003_geocodecache_hospitalcache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BotJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('use_cache', models.BooleanField(default=True)),
+                ('suggested_hospitals', models.JSONField(blank=True, default=list)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('record', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='bot_job', to='health.healthrecord')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='health_botj_status_bb347a_idx')],
+            },
+        ),
+    ]
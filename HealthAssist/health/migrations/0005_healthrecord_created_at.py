@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:11
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health', '0004_botjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='healthrecord',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='healthrecord',
+            index=models.Index(fields=['user', 'created_at'], name='healthrecord_user_created_idx'),
+        ),
+    ]
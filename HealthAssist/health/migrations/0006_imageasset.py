@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:23
+
+import django.db.models.deletion
+import health.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health', '0005_healthrecord_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageAsset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('original', models.FileField(upload_to=health.models.asset_path)),
+                ('content_type', models.CharField(max_length=50)),
+                ('size', models.PositiveIntegerField()),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('thumbnail', models.FileField(blank=True, upload_to=health.models.asset_path)),
+                ('model_input', models.FileField(blank=True, upload_to=health.models.asset_path)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('variants_built_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='healthrecord',
+            name='asset',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='records', to='health.imageasset'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:31
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health', '0006_imageasset'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Hospital',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('address', models.TextField(blank=True)),
+                ('city', models.CharField(blank=True, max_length=100)),
+                ('lat', models.FloatField()),
+                ('lon', models.FloatField()),
+                ('source', models.CharField(blank=True, max_length=100)),
+                ('external_id', models.CharField(blank=True, max_length=100)),
+                ('imported_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['source'], name='health_hosp_source_bdb9e3_idx')],
+            },
+        ),
+    ]
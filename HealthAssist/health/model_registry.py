@@ -0,0 +1,139 @@
+"""
+On-disk registry of skin model versions.
+
+    SKIN_MODEL_REGISTRY_DIR/
+        ACTIVE                  name of the version workers should serve
+        2026-10-01/
+            manifest.json       backend, model file, class names, SKIN_INFO
+            model.h5
+        2026-10-18/
+            manifest.json
+            model.tflite
+
+A version directory is never modified once published. Rolling out (or
+back) is rewriting ACTIVE, which is done atomically; workers notice on
+their next poll and hot-swap (see ``cnn_model.swap_to``).
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+
+from django.conf import settings
+
+ACTIVE_FILE = "ACTIVE"
+MANIFEST_FILE = "manifest.json"
+VERSION_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+
+class RegistryError(Exception):
+    pass
+
+
+class Manifest:
+    """What a worker needs to serve one model version."""
+
+    def __init__(self, version, class_names, skin_info, backend=None, model_path=None):
+        self.version = version
+        self.class_names = list(class_names)
+        self.skin_info = skin_info
+        self.backend = backend
+        self.model_path = model_path
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            data = json.load(f)
+        return cls(
+            data["version"],
+            data["class_names"],
+            data.get("skin_info", {}),
+            backend=data["backend"],
+            model_path=os.path.join(directory, data["model_file"]),
+        )
+
+
+# Versions are immutable, so parsed manifests are cached for good
+manifests = {}
+
+
+def registry_dir():
+    return getattr(settings, "SKIN_MODEL_REGISTRY_DIR", "")
+
+
+def version_dir(version):
+    if not VERSION_PATTERN.match(version or ""):
+        raise RegistryError(f"Invalid model version {version!r}")
+    return os.path.join(registry_dir(), version)
+
+
+def get_manifest(version):
+    if version not in manifests:
+        try:
+            manifests[version] = Manifest.load(version_dir(version))
+        except (OSError, ValueError, KeyError) as e:
+            raise RegistryError(f"Cannot read manifest for {version!r}: {e}") from e
+    return manifests[version]
+
+
+def list_versions():
+    root = registry_dir()
+    if not root or not os.path.isdir(root):
+        return []
+    return sorted(
+        name for name in os.listdir(root)
+        if os.path.isfile(os.path.join(root, name, MANIFEST_FILE))
+    )
+
+
+def active_version():
+    """The version named in ACTIVE, or None without a registry."""
+    root = registry_dir()
+    if not root:
+        return None
+    try:
+        with open(os.path.join(root, ACTIVE_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _write_atomic(path, text):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    with os.fdopen(fd, "w") as f:
+        f.write(text)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+
+
+def activate(version):
+    get_manifest(version)  # refuse to point ACTIVE at something unloadable
+    _write_atomic(os.path.join(registry_dir(), ACTIVE_FILE), version + "\n")
+
+
+def publish(version, model_file, backend, class_names, skin_info):
+    """Copy a model file into a new version directory with its manifest."""
+    directory = version_dir(version)
+    if os.path.exists(directory):
+        raise RegistryError(f"Version {version!r} already exists; versions are immutable")
+    os.makedirs(registry_dir(), exist_ok=True)
+    staging = tempfile.mkdtemp(dir=registry_dir(), prefix=".publish-")
+    try:
+        filename = "model" + os.path.splitext(model_file)[1]
+        shutil.copyfile(model_file, os.path.join(staging, filename))
+        manifest = {
+            "version": version,
+            "backend": backend,
+            "model_file": filename,
+            "class_names": list(class_names),
+            "skin_info": skin_info,
+        }
+        _write_atomic(os.path.join(staging, MANIFEST_FILE), json.dumps(manifest, indent=2))
+        # The directory appears complete or not at all
+        os.chmod(staging, 0o755)
+        os.rename(staging, directory)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return get_manifest(version)
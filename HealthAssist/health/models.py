@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 class UserProfile(models.Model):
     username = models.CharField(max_length=150, unique=True)
@@ -16,6 +17,32 @@ class UserProfile(models.Model):
         return self.username
 
 
+def asset_path(instance, filename):
+    # assets/ab/abcdef....jpg: content-addressed, fanned out by hash prefix
+    return f"assets/{instance.sha256[:2]}/{filename}"
+
+
+class ImageAsset(models.Model):
+    """
+    An uploaded image stored once, downscaled, under the SHA-256 of the
+    uploaded bytes, with its model-input copy (made from the upload) and a
+    thumbnail built off-request.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    original = models.FileField(upload_to=asset_path)
+    content_type = models.CharField(max_length=50)
+    size = models.PositiveIntegerField()
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    thumbnail = models.FileField(upload_to=asset_path, blank=True)
+    model_input = models.FileField(upload_to=asset_path, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    variants_built_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.sha256
+
+
 class HealthRecord(models.Model):
     user = models.ForeignKey(
         UserProfile,
@@ -26,7 +53,86 @@ class HealthRecord(models.Model):
     )
     message = models.TextField()
     image = models.ImageField(upload_to='health_images/', blank=True, null=True)
+    asset = models.ForeignKey(
+        ImageAsset,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='records'
+    )
     bot_response = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "created_at"], name="healthrecord_user_created_idx")]
 
     def __str__(self):
         return f"{self.user.username if self.user else 'Anonymous'} - {self.message[:50]}"
+
+
+class GeocodeCache(models.Model):
+    """Address -> coordinates, keyed by the SHA-256 of the normalized address."""
+    address_key = models.CharField(max_length=64, unique=True)
+    address = models.TextField()
+    lat = models.FloatField()
+    lon = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.address} ({self.lat}, {self.lon})"
+
+
+class HospitalCache(models.Model):
+    """Nearby hospitals for one geohash cell, refreshed after HOSPITAL_CACHE_TTL."""
+    geohash = models.CharField(max_length=12, unique=True)
+    hospitals = models.JSONField(default=list)
+    fetched_at = models.DateTimeField()
+
+    def __str__(self):
+        return self.geohash
+
+
+class Hospital(models.Model):
+    """
+    A hospital from an imported dataset (`manage.py import_hospitals`),
+    served by health.hospital_index without calling Geoapify.
+    """
+    name = models.CharField(max_length=255)
+    address = models.TextField(blank=True)
+    city = models.CharField(max_length=100, blank=True)  # normalized, for offline geocoding
+    lat = models.FloatField()
+    lon = models.FloatField()
+    source = models.CharField(max_length=100, blank=True)
+    external_id = models.CharField(max_length=100, blank=True)
+    imported_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=["source"])]
+
+    def __str__(self):
+        return self.name
+
+
+class BotJob(models.Model):
+    """A queued /user/bot/ request, processed by `manage.py run_bot_worker`."""
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [(PENDING, "Pending"), (RUNNING, "Running"), (DONE, "Done"), (FAILED, "Failed")]
+
+    record = models.OneToOneField(HealthRecord, on_delete=models.CASCADE, related_name='bot_job')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    use_cache = models.BooleanField(default=True)
+    suggested_hospitals = models.JSONField(default=list, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    def __str__(self):
+        return f"Job {self.pk} ({self.status})"
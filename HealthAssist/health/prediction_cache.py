@@ -0,0 +1,91 @@
+"""
+Content-addressed cache of skin predictions.
+
+Results are keyed by the SHA-256 of the uploaded bytes and, optionally, by a
+64-bit difference hash (dHash) of the picture so a re-encoded or resized copy
+of the same photo also hits. Every key includes the model version, so a new
+or hot-swapped model never serves results cached from an old one.
+"""
+import copy
+
+import numpy as np
+from django.conf import settings
+from PIL import Image
+
+from . import metrics
+from .caching import Counters, DjangoCache, LRUCache
+from .cnn_model import model_version, predict_skin_disease
+from .image_store import content_hash
+from .preprocessing import load_image
+
+stats = Counters("exact_hits", "perceptual_hits", "misses")
+
+
+def collect_stats():
+    yield (
+        "skin_prediction_cache_lookups_total",
+        "counter",
+        "Skin prediction cache lookups by result.",
+        [({"result": name}, value) for name, value in stats.snapshot().items()],
+    )
+
+
+metrics.add_collector(collect_stats)
+
+# Global cache (lazy init)
+cache = None
+
+
+def get_cache():
+    global cache
+    if cache is None:
+        ttl = getattr(settings, "SKIN_CACHE_TTL", 3600)
+        if getattr(settings, "SKIN_CACHE_BACKEND", "local") == "django":
+            cache = DjangoCache(getattr(settings, "SKIN_CACHE_ALIAS", "default"), ttl=ttl, prefix="skinpred:")
+        else:
+            cache = LRUCache(getattr(settings, "SKIN_CACHE_MAX_ENTRIES", 2048), ttl=ttl)
+    return cache
+
+
+def perceptual_hash(img):
+    """64-bit dHash: compares neighbouring pixels of a 9x8 grayscale thumbnail."""
+    pixels = np.asarray(load_image(img, (9, 8), Image.BILINEAR).convert("L"), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return f"{int(''.join('1' if b else '0' for b in bits), 2):016x}"
+
+
+def cached_predict_skin_disease(img, digest=None):
+    """
+    ``predict_skin_disease`` with a result cache in front of it. ``digest``
+    is the SHA-256 of the upload when ``img`` is its stored model-input copy,
+    which preprocesses to the same pixels (see image_store), so both share
+    cache entries.
+    """
+    backend = get_cache()
+    with metrics.stage("skin.cache_lookup"):
+        version = model_version()
+        digest = digest or content_hash(img)
+        exact_key = f"{version}:sha256:{digest}"
+        result = backend.get(exact_key)
+        if result is not None:
+            stats.incr("exact_hits")
+            return copy.deepcopy(result)
+
+        dhash = None
+        if getattr(settings, "SKIN_CACHE_PERCEPTUAL", False):
+            dhash = perceptual_hash(img)
+            result = backend.get(f"{version}:dhash:{dhash}")
+            if result is not None:
+                stats.incr("perceptual_hits")
+                backend.set(exact_key, result)
+                return copy.deepcopy(result)
+
+    stats.incr("misses")
+    result = predict_skin_disease(img)
+    # Store under the version that actually answered; a hot swap may have
+    # happened since the lookup.
+    version = result["model_version"]
+    backend.set(f"{version}:sha256:{digest}", result)
+    if dhash:
+        backend.set(f"{version}:dhash:{dhash}", result)
+    return copy.deepcopy(result)
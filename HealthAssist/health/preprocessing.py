@@ -0,0 +1,84 @@
+"""
+Image preprocessing for the skin disease model.
+
+Uploads are decoded straight from memory. For JPEGs, Pillow's draft mode
+lets libjpeg decode at 1/2, 1/4 or 1/8 scale, so a 12 MP phone photo is never
+decoded at full resolution just to be shrunk to 224x224.
+"""
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+TARGET_SIZE = (224, 224)
+
+# Shared pool for multi-image requests; Pillow releases the GIL while decoding
+executor = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="preprocess")
+
+
+def load_image(source, target_size=TARGET_SIZE, resample=Image.NEAREST):
+    """
+    Decode ``source`` (a path or file-like object) into an upright RGB image
+    of ``target_size``. Nearest-neighbour resampling matches the
+    ``keras.preprocessing.image.load_img`` default the model was trained with.
+    """
+    if hasattr(source, "seek"):
+        source.seek(0)
+    with Image.open(source) as img:
+        # draft() picks the smallest DCT scale that still covers target_size;
+        # it is a no-op for formats other than JPEG.
+        img.draft("RGB", target_size)
+        img = ImageOps.exif_transpose(img)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        if img.size != target_size:
+            img = img.resize(target_size, resample, reducing_gap=3.0)
+        return img
+
+
+def image_to_array(img):
+    """Model input for a decoded image: float32 HxWx3 scaled to [0, 1]."""
+    return np.asarray(img, dtype=np.float32) / 255.0
+
+
+def preprocess_image(source, target_size=TARGET_SIZE):
+    """Return the model input for one image: float32 HxWx3 scaled to [0, 1]."""
+    return image_to_array(load_image(source, target_size))
+
+
+def downscaled_copy(source, max_side=512, quality=85):
+    """
+    JPEG copy of an upload that fits in ``max_side`` x ``max_side``, for
+    storing alongside a HealthRecord. Returns a ContentFile named after the
+    upload.
+    """
+    if hasattr(source, "seek"):
+        source.seek(0)
+    with Image.open(source) as img:
+        img.draft("RGB", (max_side, max_side))
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+        buffer = io.BytesIO()
+        img.save(buffer, "JPEG", quality=quality, optimize=True)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    stem = os.path.splitext(os.path.basename(getattr(source, "name", "") or "image"))[0]
+    return ContentFile(buffer.getvalue(), name=f"{stem}.jpg")
+
+
+def preprocess_images(sources, target_size=TARGET_SIZE):
+    """
+    Preprocess several images in parallel. Returns one entry per source, in
+    order: the array, or the exception raised while decoding it.
+    """
+    futures = [executor.submit(preprocess_image, source, target_size) for source in sources]
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(e)
+    return results
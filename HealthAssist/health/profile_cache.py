@@ -0,0 +1,53 @@
+"""
+Per-user UserProfile cache for the hot auth path (UserInfo and the bot
+views). Entries are dropped by the post_save / post_delete handlers in
+``signals.py`` and otherwise expire after PROFILE_CACHE_TTL seconds.
+
+Invalidation only reaches other workers through a shared cache, so the
+cache is used only when PROFILE_CACHE_ENABLED (REDIS_URL is set); with
+per-process memory every lookup goes to the database. Cached profiles
+never hold the password: it is deferred, and login checks it against the
+database.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import UserProfile
+
+
+def _id_key(user_id):
+    return f"userprofile:id:{user_id}"
+
+
+def _enabled():
+    return getattr(settings, "PROFILE_CACHE_ENABLED", False)
+
+
+def _profiles():
+    return UserProfile.objects.defer("password")
+
+
+def get_profile(user_id):
+    """Like ``UserProfile.objects.get(id=user_id)`` (password deferred), usually without a query."""
+    if not _enabled():
+        return _profiles().get(id=user_id)
+    profile = cache.get(_id_key(user_id))
+    if profile is None:
+        profile = _profiles().get(id=user_id)
+        cache.set(_id_key(user_id), profile, settings.PROFILE_CACHE_TTL)
+    return profile
+
+
+async def aget_profile(user_id):
+    if not _enabled():
+        return await _profiles().aget(id=user_id)
+    profile = await cache.aget(_id_key(user_id))
+    if profile is None:
+        profile = await _profiles().aget(id=user_id)
+        await cache.aset(_id_key(user_id), profile, settings.PROFILE_CACHE_TTL)
+    return profile
+
+
+def invalidate(profile):
+    if _enabled():
+        cache.delete(_id_key(profile.id))
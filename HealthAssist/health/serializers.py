@@ -1,19 +1,54 @@
+from django.urls import reverse
 from rest_framework import serializers
 from .models import UserProfile, HealthRecord
 
+
+def asset_url(record, variant):
+    """URL of a variant of the record's stored image, or None."""
+    if record.asset_id is None:
+        return None
+    return reverse("image-asset", args=[record.asset.sha256, variant])
+
 class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserProfile
         fields = '__all__'
+        # Accepted on registration, never sent back. This changed the
+        # response shape: register, login, the profile endpoints and records'
+        # nested "user" no longer include a "password" key.
+        extra_kwargs = {"password": {"write_only": True}}
 
 
 class HealthRecordSerializer(serializers.ModelSerializer):
     user = UserProfileSerializer(read_only=True)
     bot_reply = serializers.CharField(source="bot_response", read_only=True)  # explicit field
+    image_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = HealthRecord
+        fields = ["id", "user", "message", "bot_response", "bot_reply", "image_url", "thumbnail_url"]
+
+    def get_image_url(self, record):
+        return asset_url(record, "original")
+
+    def get_thumbnail_url(self, record):
+        return asset_url(record, "thumbnail")
+
+class HealthRecordListSerializer(serializers.ModelSerializer):
+    """Slim history row: no embedded UserProfile."""
+    image_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
 
     class Meta:
         model = HealthRecord
-        fields = ["id", "user", "message", "bot_response", "bot_reply"]
+        fields = ["id", "message", "bot_response", "image", "image_url", "thumbnail_url", "created_at"]
+
+    def get_image_url(self, record):
+        return asset_url(record, "original")
+
+    def get_thumbnail_url(self, record):
+        return asset_url(record, "thumbnail")
 
 class SkinDiseaseSerializer(serializers.Serializer):
     image = serializers.ImageField()
\ No newline at end of file
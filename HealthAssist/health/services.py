@@ -0,0 +1,574 @@
+"""
+External services behind the health bot: Groq chat completions for the
+reply and Geoapify for nearby hospitals. Each call has a blocking variant
+for HealthRecordView and an async variant for HealthRecordAsyncView; both
+go through the pooled clients in ``http_client`` and share request building
+and response parsing.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+from datetime import timedelta
+
+import httpx
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from . import admission, hospital_index, metrics
+from .caching import LRUCache
+from .cnn_model import predict_skin_disease
+from .geo import address_key, geohash_center, geohash_encode, map_link, normalize_address
+from .http_client import CircuitOpenError, get_upstream
+from .models import GeocodeCache, HospitalCache
+
+logger = logging.getLogger(__name__)
+
+GROQ_PATH = "/openai/v1/chat/completions"
+GROQ_MODEL = "llama-3.1-8b-instant"
+GEOAPIFY_GEOCODE_PATH = "/v1/geocode/search"
+GEOAPIFY_PLACES_PATH = "/v2/places"
+
+GROQ_TIMEOUT = 30
+IMAGE_SUMMARY_TOP_K = 3
+GEOAPIFY_TIMEOUT = 10
+
+SYSTEM_PROMPT = (
+    "You are a helpful health assistant. "
+    "Always answer in very simple English with 4 parts:\n"
+    "1. Cause explanation\n2. Home remedies\n3. Safe OTC medicines\n"
+    "4. Advice to see a doctor if it worsens."
+)
+
+FALLBACK_ADVICE = (
+    "⚠️ The AI assistant is currently unavailable.\n\n"
+    "General suggestions:\n"
+    "1. Rest and drink plenty of water.\n"
+    "2. Use paracetamol for fever.\n"
+    "3. Try simple home remedies like honey with warm water for cough.\n"
+    "4. See a doctor if severe symptoms appear.\n\n"
+    "⚠️ This is not medical advice. Please consult a doctor."
+)
+
+HOSPITALS_UNAVAILABLE = [{"error": "Unable to fetch hospitals at this time."}]
+
+# Returned by _stream_token for the last line of a streamed reply
+STREAM_DONE = object()
+
+# Function words and filler dropped when normalizing a message for the reply
+# cache. Negations ("no", "not", "without") are kept: they change the answer.
+STOPWORDS = frozenset("""
+    a an the and or but so of to in on at for from by with about as into
+    i im ive me my myself we our you your it its this that these those
+    is am are was were be been being have has had having do does did
+    can could would should will just also very really quite bit little some
+    since got get getting please hi hello hey doctor sir madam thanks thank
+""".split())
+
+# Text-only bot replies, keyed by normalized message + prompt + model
+reply_cache = LRUCache(settings.LLM_CACHE_MAX_ENTRIES, ttl=settings.LLM_CACHE_TTL)
+
+# In-process LRUs in front of the GeocodeCache / HospitalCache tables
+geocode_lru = LRUCache(settings.GEO_LRU_SIZE)
+hospital_lru = LRUCache(settings.GEO_LRU_SIZE, ttl=settings.HOSPITAL_CACHE_TTL)
+
+
+hospital_lookups = metrics.counter(
+    "hospital_lookups_total", "Hospital suggestions by where they came from: local index or geoapify.", ["source"]
+)
+
+
+def collect_cache_sizes():
+    yield (
+        "bot_cache_entries",
+        "gauge",
+        "Entries in this worker's bot reply and hospital lookup caches.",
+        [
+            ({"cache": "reply"}, len(reply_cache)),
+            ({"cache": "geocode"}, len(geocode_lru)),
+            ({"cache": "hospitals"}, len(hospital_lru)),
+        ],
+    )
+
+
+metrics.add_collector(collect_cache_sizes)
+
+
+def image_summary(uploaded_image, user_message=""):
+    """
+    Compact text description of a skin photo for the LLM: the local CNN's
+    top classes and the SKIN_INFO entry of the most likely one, instead of
+    megabytes of base64 a text model cannot read.
+    """
+    try:
+        result = predict_skin_disease(uploaded_image, top_k=IMAGE_SUMMARY_TOP_K)
+    except admission.Overloaded:
+        # Shed under load: the reply goes ahead on the text alone
+        logger.warning("Skin image analysis skipped: inference is overloaded")
+        summary = "I attached a photo of my skin, but it could not be analysed."
+    except Exception as e:
+        logger.exception("Skin image analysis error: %s", e)
+        summary = "I attached a photo of my skin, but it could not be analysed."
+    else:
+        matches = "; ".join(
+            f"{p['class_name']} ({p['confidence']:.0f}%)" for p in result["top_predictions"]
+        )
+        summary = (
+            "An automatic skin-image classifier looked at my photo. "
+            f"Top matches: {matches}.\n"
+            f"About {result['class_name']}: {result['description']}\n"
+            f"Usual treatment: {result['medical_treatment']}\n"
+            f"Home remedies: {result['home_remedies']}\n"
+            f"Diet: {result['diet']}"
+        )
+    if user_message:
+        summary += f"\nMy symptoms: {user_message}"
+    return summary
+
+
+def build_messages(user_message, uploaded_image=None):
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+
+    # ✅ If image provided, send the local CNN's findings, not the pixels
+    if uploaded_image:
+        messages.append({"role": "user", "content": image_summary(uploaded_image, user_message)})
+    else:
+        # Otherwise use text message
+        messages.append({"role": "user", "content": f"My symptoms: {user_message}"})
+    return messages
+
+
+def _groq_request(messages, groq_api_key):
+    return {
+        "json": {
+            "model": GROQ_MODEL,
+            "messages": messages,
+            "max_tokens": 400,
+            "temperature": 0.6,
+        },
+        "headers": {
+            "Authorization": f"Bearer {groq_api_key}",
+            "Content-Type": "application/json",
+        },
+        "timeout": GROQ_TIMEOUT,
+    }
+
+
+def _groq_reply(data):
+    choices = data.get("choices", [])
+    if choices and "message" in choices[0]:
+        return choices[0]["message"].get("content", FALLBACK_ADVICE).strip()
+    return FALLBACK_ADVICE
+
+
+def ask_groq(messages):
+    """Bot reply for ``messages``, or FALLBACK_ADVICE if Groq is unavailable."""
+    groq_api_key = os.environ.get("GROQ_API_KEY", "")
+    if not groq_api_key:
+        return FALLBACK_ADVICE
+    try:
+        groq_res = get_upstream("groq").request("POST", GROQ_PATH, **_groq_request(messages, groq_api_key))
+        groq_res.raise_for_status()
+        return _groq_reply(groq_res.json())
+    except CircuitOpenError:
+        return FALLBACK_ADVICE
+    except requests.RequestException as e:
+        logger.warning("Groq API error: %s", e)
+        return FALLBACK_ADVICE
+
+
+def normalize_message(message):
+    """"I have FEVER and a cough!!" -> "fever cough"."""
+    words = re.sub(r"[^\w\s]", " ", message.casefold().replace("'", "")).split()
+    return " ".join(w for w in words if w not in STOPWORDS)
+
+
+def reply_cache_key(user_message):
+    key = "\x00".join((GROQ_MODEL, SYSTEM_PROMPT, normalize_message(user_message)))
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def get_bot_reply(user_message, uploaded_image=None, use_cache=True):
+    """
+    Bot reply for a message or image. Text-only replies are served from
+    ``reply_cache`` when possible; the fallback advice is never cached.
+    """
+    if uploaded_image or not use_cache:
+        return ask_groq(build_messages(user_message, uploaded_image))
+    key = reply_cache_key(user_message)
+    bot_reply = reply_cache.get(key)
+    if bot_reply is None:
+        bot_reply = ask_groq(build_messages(user_message))
+        if bot_reply != FALLBACK_ADVICE:
+            reply_cache.set(key, bot_reply)
+    return bot_reply
+
+
+async def aget_bot_reply(user_message, uploaded_image=None, use_cache=True):
+    if uploaded_image or not use_cache:
+        # Image analysis runs the CNN; keep it off the event loop, in the
+        # request's sync thread so Django manages any DB connection it opens
+        messages = await sync_to_async(build_messages)(user_message, uploaded_image)
+        return await aask_groq(messages)
+    key = reply_cache_key(user_message)
+    bot_reply = reply_cache.get(key)
+    if bot_reply is None:
+        bot_reply = await aask_groq(build_messages(user_message))
+        if bot_reply != FALLBACK_ADVICE:
+            reply_cache.set(key, bot_reply)
+    return bot_reply
+
+
+def _stream_token(line):
+    """The reply token in one line of Groq's event stream, if any; STREAM_DONE at the end."""
+    if not line or not line.startswith("data:"):
+        return None
+    payload = line[len("data:"):].strip()
+    if payload == "[DONE]":
+        return STREAM_DONE
+    choices = json.loads(payload).get("choices", [])
+    return choices[0].get("delta", {}).get("content") if choices else None
+
+
+def stream_groq(messages):
+    """
+    Yield the reply piece by piece using Groq's ``stream: true`` mode.
+    Yields FALLBACK_ADVICE instead if Groq fails before the first token; a
+    failure mid-stream ends the reply where it stopped.
+    """
+    groq_api_key = os.environ.get("GROQ_API_KEY", "")
+    if not groq_api_key:
+        yield FALLBACK_ADVICE
+        return
+    request = _groq_request(messages, groq_api_key)
+    request["json"]["stream"] = True
+    started = False
+    try:
+        groq_res = get_upstream("groq").request("POST", GROQ_PATH, stream=True, **request)
+        groq_res.raise_for_status()
+        with groq_res:
+            for line in groq_res.iter_lines(chunk_size=None, decode_unicode=True):
+                token = _stream_token(line)
+                if token is STREAM_DONE:
+                    break
+                if token:
+                    started = True
+                    yield token
+    except CircuitOpenError:
+        pass
+    except (requests.RequestException, ValueError) as e:
+        logger.warning("Groq API error: %s", e)
+    if not started:
+        yield FALLBACK_ADVICE
+
+
+def stream_bot_reply(user_message, uploaded_image=None, use_cache=True):
+    """Streaming counterpart of ``get_bot_reply``; a cache hit arrives as one piece."""
+    if uploaded_image or not use_cache:
+        yield from stream_groq(build_messages(user_message, uploaded_image))
+        return
+    key = reply_cache_key(user_message)
+    bot_reply = reply_cache.get(key)
+    if bot_reply is not None:
+        yield bot_reply
+        return
+    pieces = []
+    for token in stream_groq(build_messages(user_message)):
+        pieces.append(token)
+        yield token
+    bot_reply = "".join(pieces).strip()
+    if bot_reply and bot_reply != FALLBACK_ADVICE:
+        reply_cache.set(key, bot_reply)
+
+
+async def astream_groq(messages):
+    """Async counterpart of ``stream_groq`` over httpx."""
+    groq_api_key = os.environ.get("GROQ_API_KEY", "")
+    if not groq_api_key:
+        yield FALLBACK_ADVICE
+        return
+    request = _groq_request(messages, groq_api_key)
+    request["json"]["stream"] = True
+    started = False
+    try:
+        groq_res = await get_upstream("groq").arequest("POST", GROQ_PATH, stream=True, **request)
+        try:
+            groq_res.raise_for_status()
+            async for line in groq_res.aiter_lines():
+                token = _stream_token(line)
+                if token is STREAM_DONE:
+                    break
+                if token:
+                    started = True
+                    yield token
+        finally:
+            await groq_res.aclose()
+    except CircuitOpenError:
+        pass
+    except (httpx.HTTPError, ValueError) as e:
+        logger.warning("Groq API error: %s", e)
+    if not started:
+        yield FALLBACK_ADVICE
+
+
+async def astream_bot_reply(user_message, uploaded_image=None, use_cache=True):
+    """Async counterpart of ``stream_bot_reply``."""
+    if uploaded_image or not use_cache:
+        messages = await sync_to_async(build_messages)(user_message, uploaded_image)
+        async for token in astream_groq(messages):
+            yield token
+        return
+    key = reply_cache_key(user_message)
+    bot_reply = reply_cache.get(key)
+    if bot_reply is not None:
+        yield bot_reply
+        return
+    pieces = []
+    async for token in astream_groq(build_messages(user_message)):
+        pieces.append(token)
+        yield token
+    bot_reply = "".join(pieces).strip()
+    if bot_reply and bot_reply != FALLBACK_ADVICE:
+        reply_cache.set(key, bot_reply)
+
+
+async def aask_groq(messages):
+    groq_api_key = os.environ.get("GROQ_API_KEY", "")
+    if not groq_api_key:
+        return FALLBACK_ADVICE
+    try:
+        groq_res = await get_upstream("groq").arequest("POST", GROQ_PATH, **_groq_request(messages, groq_api_key))
+        groq_res.raise_for_status()
+        return _groq_reply(groq_res.json())
+    except CircuitOpenError:
+        return FALLBACK_ADVICE
+    except httpx.HTTPError as e:
+        logger.warning("Groq API error: %s", e)
+        return FALLBACK_ADVICE
+
+
+def _geocode_request(city_name, geoapify_api_key):
+    return {
+        "params": {"text": city_name, "apiKey": geoapify_api_key},
+        "timeout": GEOAPIFY_TIMEOUT,
+    }
+
+
+def _places_request(cell, geoapify_api_key):
+    # Search from the cell centre so every address in the cell shares the result
+    lat, lon = geohash_center(cell)
+    return {
+        "params": {
+            "categories": "healthcare.hospital",
+            "bias": f"proximity:{lon},{lat}",
+            "limit": 5,
+            "apiKey": geoapify_api_key,
+        },
+        "timeout": GEOAPIFY_TIMEOUT,
+    }
+
+
+def _first_location(data):
+    features = data.get("features", [])
+    if not features:
+        return None
+    lon, lat = features[0]["geometry"]["coordinates"][:2]
+    return lat, lon
+
+
+def _hospitals(data):
+    return [
+        {
+            "name": f["properties"].get("name", "Unnamed"),
+            "address": f["properties"].get("formatted", "Address not available"),
+            "lat": f["properties"].get("lat"),
+            "lon": f["properties"].get("lon"),
+            "map_link": map_link(f["properties"].get("lat"), f["properties"].get("lon"))
+        }
+        for f in data.get("features", [])
+    ]
+
+
+def _hospital_cell(lat, lon):
+    return geohash_encode(lat, lon, settings.GEOHASH_PRECISION)
+
+
+# Cache steps shared by the blocking and async lookups below; only the
+# database and HTTP calls differ between the two.
+
+def _stored_location(key):
+    return GeocodeCache.objects.filter(address_key=key).values_list("lat", "lon")
+
+
+def _remember_location(key, location):
+    if location:
+        geocode_lru.set(key, location)
+    return location
+
+
+def _location_defaults(city_name, location):
+    return {"address": normalize_address(city_name), "lat": location[0], "lon": location[1]}
+
+
+def _stored_hospitals(cell):
+    fresh_after = timezone.now() - timedelta(seconds=settings.HOSPITAL_CACHE_TTL)
+    return HospitalCache.objects.filter(geohash=cell, fetched_at__gte=fresh_after)
+
+
+def _remember_hospitals(cell, hospitals):
+    hospital_lru.set(cell, hospitals)
+    return hospitals
+
+
+def _hospitals_defaults(hospitals):
+    return {"hospitals": hospitals, "fetched_at": timezone.now()}
+
+
+def _local_hospitals(index, location):
+    hospitals = index.nearest(*location) if index is not None and location else []
+    if hospitals:
+        hospital_lookups.inc(source="local")
+    return hospitals
+
+
+def cached_location(city_name):
+    """(lat, lon) for an address already geocoded: LRU, then GeocodeCache."""
+    key = address_key(city_name)
+    return geocode_lru.get(key) or _remember_location(key, _stored_location(key).first())
+
+
+async def acached_location(city_name):
+    key = address_key(city_name)
+    return geocode_lru.get(key) or _remember_location(key, await _stored_location(key).afirst())
+
+
+def geocode(geoapify, city_name, geoapify_api_key):
+    """(lat, lon) for an address: LRU, then GeocodeCache, then Geoapify."""
+    location = cached_location(city_name)
+    if location:
+        return location
+
+    geo_res = geoapify.request("GET", GEOAPIFY_GEOCODE_PATH, **_geocode_request(city_name, geoapify_api_key))
+    geo_res.raise_for_status()
+    location = _first_location(geo_res.json())
+    key = address_key(city_name)
+    if location:
+        GeocodeCache.objects.update_or_create(address_key=key, defaults=_location_defaults(city_name, location))
+    return _remember_location(key, location)
+
+
+async def ageocode(geoapify, city_name, geoapify_api_key):
+    location = await acached_location(city_name)
+    if location:
+        return location
+
+    geo_res = await geoapify.arequest("GET", GEOAPIFY_GEOCODE_PATH, **_geocode_request(city_name, geoapify_api_key))
+    geo_res.raise_for_status()
+    location = _first_location(geo_res.json())
+    key = address_key(city_name)
+    if location:
+        await GeocodeCache.objects.aupdate_or_create(address_key=key, defaults=_location_defaults(city_name, location))
+    return _remember_location(key, location)
+
+
+def nearby_hospitals(geoapify, lat, lon, geoapify_api_key):
+    """Hospitals for the geohash cell around (lat, lon), cached per cell with a TTL."""
+    cell = _hospital_cell(lat, lon)
+    hospitals = hospital_lru.get(cell)
+    if hospitals is not None:
+        return hospitals
+    row = _stored_hospitals(cell).first()
+    if row:
+        return _remember_hospitals(cell, row.hospitals)
+
+    places_res = geoapify.request("GET", GEOAPIFY_PLACES_PATH, **_places_request(cell, geoapify_api_key))
+    places_res.raise_for_status()
+    hospitals = _hospitals(places_res.json())
+    HospitalCache.objects.update_or_create(geohash=cell, defaults=_hospitals_defaults(hospitals))
+    return _remember_hospitals(cell, hospitals)
+
+
+async def anearby_hospitals(geoapify, lat, lon, geoapify_api_key):
+    cell = _hospital_cell(lat, lon)
+    hospitals = hospital_lru.get(cell)
+    if hospitals is not None:
+        return hospitals
+    row = await _stored_hospitals(cell).afirst()
+    if row:
+        return _remember_hospitals(cell, row.hospitals)
+
+    places_res = await geoapify.arequest("GET", GEOAPIFY_PLACES_PATH, **_places_request(cell, geoapify_api_key))
+    places_res.raise_for_status()
+    hospitals = _hospitals(places_res.json())
+    await HospitalCache.objects.aupdate_or_create(geohash=cell, defaults=_hospitals_defaults(hospitals))
+    return _remember_hospitals(cell, hospitals)
+
+
+def find_hospitals(city_name):
+    """
+    Up to five hospitals near ``city_name``; empty without an API key or
+    while the Geoapify circuit is open. With an imported hospital dataset
+    they come from the local index, and Geoapify is only asked to geocode
+    an address the dataset does not name, or for areas it does not cover.
+    Repeat lookups for a known address and geohash cell are served from
+    cache without calling Geoapify.
+    """
+    index = hospital_index.get_index()
+    location = None
+    if index is not None:
+        # Offline first: an address geocoded before, or a city in the dataset
+        location = cached_location(city_name) or index.locate(city_name)
+    hospitals = _local_hospitals(index, location)
+    if hospitals:
+        return hospitals
+
+    geoapify_api_key = os.environ.get("GEOAPIFY_API_KEY", "")
+    if not geoapify_api_key:
+        return []
+    geoapify = get_upstream("geoapify")
+    try:
+        location = location or geocode(geoapify, city_name, geoapify_api_key)
+        if not location:
+            return []
+        hospitals = _local_hospitals(index, location)
+        if hospitals:
+            return hospitals
+        hospital_lookups.inc(source="geoapify")
+        return nearby_hospitals(geoapify, *location, geoapify_api_key)
+    except CircuitOpenError:
+        return []
+    except requests.RequestException as e:
+        logger.warning("Geoapify API error: %s", e)
+        return HOSPITALS_UNAVAILABLE
+
+
+async def afind_hospitals(city_name):
+    index = await hospital_index.aget_index()
+    location = None
+    if index is not None:
+        location = await acached_location(city_name) or index.locate(city_name)
+    hospitals = _local_hospitals(index, location)
+    if hospitals:
+        return hospitals
+
+    geoapify_api_key = os.environ.get("GEOAPIFY_API_KEY", "")
+    if not geoapify_api_key:
+        return []
+    geoapify = get_upstream("geoapify")
+    try:
+        location = location or await ageocode(geoapify, city_name, geoapify_api_key)
+        if not location:
+            return []
+        hospitals = _local_hospitals(index, location)
+        if hospitals:
+            return hospitals
+        hospital_lookups.inc(source="geoapify")
+        return await anearby_hospitals(geoapify, *location, geoapify_api_key)
+    except CircuitOpenError:
+        return []
+    except httpx.HTTPError as e:
+        logger.warning("Geoapify API error: %s", e)
+        return HOSPITALS_UNAVAILABLE
@@ -1,3 +1,203 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models.query import QuerySet
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from . import http_client, image_store, jobs, prediction_cache
+from .caching import LRUCache
+from .http_client import CircuitBreaker
+from .models import BotJob, HealthRecord, UserProfile
+from .services import reply_cache_key
+
+
+def make_user(username):
+    return UserProfile.objects.create(
+        username=username, email=f"{username}@example.com", password="secret", phone="1",
+        address="Ongole", age=30, gender="f", blood_group="O+", height=160, weight=60,
+    )
+
+
+def png_upload(color=(200, 120, 80), name="skin.png"):
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 480), color).save(buffer, "PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+class ClaimJobTests(TestCase):
+    def setUp(self):
+        user = make_user("worker")
+        self.first = jobs.enqueue(HealthRecord.objects.create(user=user, message="fever"))
+        self.second = jobs.enqueue(HealthRecord.objects.create(user=user, message="cough"))
+
+    def test_claims_each_job_once(self):
+        claimed = [jobs.claim_job(), jobs.claim_job(), jobs.claim_job()]
+        self.assertEqual([job.id for job in claimed[:2]], [self.first.id, self.second.id])
+        self.assertIsNone(claimed[2])
+        self.assertEqual([job.attempts for job in claimed[:2]], [1, 1])
+
+    def test_job_taken_by_another_worker_is_skipped(self):
+        # Another worker claims the oldest job between our listing of
+        # candidates and our conditional UPDATE
+        real_update = QuerySet.update
+
+        def racing_update(queryset, **kwargs):
+            if not racing_update.raced:
+                racing_update.raced = True
+                real_update(BotJob.objects.filter(id=self.first.id), status=BotJob.RUNNING)
+            return real_update(queryset, **kwargs)
+
+        racing_update.raced = False
+        with mock.patch.object(QuerySet, "update", racing_update):
+            job = jobs.claim_job()
+        self.assertEqual(job.id, self.second.id)
+        self.first.refresh_from_db()
+        # Our worker never counted an attempt on the job it lost
+        self.assertEqual(self.first.attempts, 0)
+
+
+class AssetOwnershipTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.owner = make_user("owner")
+        self.other = make_user("other")
+        self.asset = image_store.store(png_upload(), schedule=False)
+        HealthRecord.objects.create(user=self.owner, message="rash", asset=self.asset)
+        self.image_url = f"/user/images/{self.asset.sha256}/original/"
+
+    def log_in(self, user):
+        session = self.client.session
+        session["user_id"] = user.id
+        session.save()
+
+    def test_image_needs_a_session(self):
+        self.assertEqual(self.client.get(self.image_url).status_code, 401)
+
+    def test_image_of_another_user_looks_missing(self):
+        self.log_in(self.other)
+        self.assertEqual(self.client.get(self.image_url).status_code, 404)
+        self.assertEqual(self.client.get(f"/user/images/{'0' * 64}/original/").status_code, 404)
+
+    def test_owner_gets_a_privately_cached_image(self):
+        self.log_in(self.owner)
+        response = self.client.get(self.image_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Cache-Control"].startswith("private"))
+
+    @mock.patch.object(prediction_cache, "cached_predict_skin_disease", return_value={"class_name": "Eczema"})
+    def test_prediction_from_asset_checks_the_owner(self, predict):
+        self.assertEqual(self.client.post("/user/skin/", {"asset": self.asset.sha256}).status_code, 404)
+        self.log_in(self.other)
+        self.assertEqual(self.client.post("/user/skin/", {"asset": self.asset.sha256}).status_code, 404)
+        predict.assert_not_called()
+
+        self.log_in(self.owner)
+        response = self.client.post("/user/skin/", {"asset": self.asset.sha256})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(predict.call_args.kwargs["digest"], self.asset.sha256)
+
+
+@override_settings(SKIN_CACHE_PERCEPTUAL=False)
+class PredictionCacheKeyTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(prediction_cache, "cache", LRUCache(16))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.version = "v1"
+        patcher = mock.patch.object(prediction_cache, "model_version", lambda: self.version)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(
+            prediction_cache, "predict_skin_disease",
+            side_effect=lambda img: {"class_name": "Eczema", "model_version": self.version},
+        )
+        self.predict = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_same_bytes_hit(self):
+        prediction_cache.cached_predict_skin_disease(png_upload())
+        prediction_cache.cached_predict_skin_disease(png_upload(name="renamed.png"))
+        self.assertEqual(self.predict.call_count, 1)
+
+    def test_different_bytes_miss(self):
+        prediction_cache.cached_predict_skin_disease(png_upload())
+        prediction_cache.cached_predict_skin_disease(png_upload(color=(10, 10, 10)))
+        self.assertEqual(self.predict.call_count, 2)
+
+    def test_new_model_version_misses(self):
+        prediction_cache.cached_predict_skin_disease(png_upload())
+        self.version = "v2"
+        prediction_cache.cached_predict_skin_disease(png_upload())
+        self.assertEqual(self.predict.call_count, 2)
+
+    def test_stored_variant_shares_the_upload_entry(self):
+        upload = png_upload()
+        prediction_cache.cached_predict_skin_disease(upload)
+        variant = png_upload(color=(0, 0, 255))
+        prediction_cache.cached_predict_skin_disease(variant, digest=image_store.content_hash(upload))
+        self.assertEqual(self.predict.call_count, 1)
+
+    def test_reply_cache_key_ignores_case_punctuation_and_filler(self):
+        self.assertEqual(reply_cache_key("I have FEVER and a cough!!"), reply_cache_key("fever cough"))
+        self.assertNotEqual(reply_cache_key("fever"), reply_cache_key("no fever"))
+
+
+class CircuitBreakerTests(TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(http_client.time, "monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30.0)
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "closed")
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "open")
+        self.assertFalse(self.breaker.allow())
+
+    def test_success_resets_the_failure_count(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_half_open_lets_one_trial_through(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.now += 30
+        self.assertEqual(self.breaker.state, "half_open")
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_trial_reopens(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "open")
+        self.now += 29
+        self.assertFalse(self.breaker.allow())
+
+    def test_posts_are_retried_only_before_they_are_sent(self):
+        refused = requests.ConnectTimeout()
+        dropped = requests.ConnectionError(ConnectionResetError())
+        self.assertTrue(http_client._retryable("POST", refused))
+        self.assertFalse(http_client._retryable("POST", dropped))
+        self.assertTrue(http_client._retryable("GET", dropped))
+        self.assertFalse(http_client._retryable("GET", requests.ReadTimeout()))
@@ -8,7 +8,15 @@ urlpatterns = [
     path('register/', UserRegister.as_view(), name='user-register'),
     path('login/', UserLogin.as_view(), name='user-login'),
     path('bot/', HealthRecordView.as_view(), name='health-record'),
+    path('bot/stream/', HealthRecordStreamView.as_view(), name='health-record-stream'),
+    path('bot/jobs/<int:job_id>/', BotJobStatusView.as_view(), name='bot-job-status'),
+    path('bot/async/', HealthRecordAsyncView.as_view(), name='health-record-async'),
+    path('records/', HealthRecordListView.as_view(), name='health-record-list'),
     path('skin/', SkinDiseasePredictionView.as_view(), name='skin-disease'),
+    path('skin/batch/', SkinDiseaseBatchPredictionView.as_view(), name='skin-disease-batch'),
+    path('skin/cache-stats/', SkinPredictionCacheStatsView.as_view(), name='skin-cache-stats'),
+    path('export/', HealthRecordExportView.as_view(), name='health-record-export'),
+    path('images/<str:sha256>/<str:variant>/', ImageAssetView.as_view(), name='image-asset'),
     path('', WelcomeView.as_view()),
 ]
 
@@ -1,16 +1,96 @@
-import os
-import requests
+import asyncio
+import json
+from asgiref.sync import sync_to_async
 from django.contrib.auth import authenticate
-from rest_framework import status, viewsets
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import generics, status, viewsets
+from rest_framework.exceptions import NotAuthenticated
+from rest_framework.pagination import CursorPagination
+from rest_framework.permissions import IsAdminUser
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 import base64
-from .models import UserProfile, HealthRecord
-from .serializers import UserProfileSerializer, HealthRecordSerializer
+from .models import UserProfile, HealthRecord, BotJob, ImageAsset
+from .serializers import UserProfileSerializer, HealthRecordSerializer, HealthRecordListSerializer
 import base64
 from .serializers import SkinDiseaseSerializer
 from .cnn_model import predict_skin_disease
+from PIL import UnidentifiedImageError
+from . import admission, export, image_store, jobs, metrics, profile_cache
+from .services import (
+    afind_hospitals, aget_bot_reply, astream_bot_reply, find_hospitals, get_bot_reply, stream_bot_reply,
+)
+
+
+def _stored_asset(uploaded_image):
+    """The content-addressed ImageAsset for an attached image, if it is one."""
+    if not uploaded_image:
+        return None
+    try:
+        return image_store.store(uploaded_image)
+    except (UnidentifiedImageError, OSError):
+        return None
+
+
+def _owned_asset(request, sha256):
+    """
+    The ImageAsset with ``sha256`` if the session user has a record with it.
+    Anything else is the same 404 as a missing image, so hashes cannot be
+    probed.
+    """
+    user_id = request.session.get("user_id")
+    asset = get_object_or_404(ImageAsset, sha256=sha256)
+    if not user_id or not asset.records.filter(user_id=user_id).exists():
+        raise Http404("No such image")
+    return asset
+
+
+def _client_key(request):
+    """Who a rate limit applies to: the logged-in user, else the client address."""
+    user_id = request.session.get("user_id")
+    if user_id:
+        return f"user:{user_id}"
+    if request.user and request.user.is_authenticated:
+        return f"auth:{request.user.pk}"
+    return f"ip:{_client_address(request)}"
+
+
+def _client_address(request):
+    """
+    The client's IP. With TRUSTED_PROXY_COUNT proxies in front, each one
+    appends the address it saw to X-Forwarded-For, so the client is that
+    many entries from the right; anything further left is client-supplied.
+    """
+    proxies = getattr(settings, "TRUSTED_PROXY_COUNT", 0)
+    forwarded = [a.strip() for a in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",") if a.strip()]
+    if proxies > 0 and len(forwarded) >= proxies:
+        return forwarded[-proxies]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def _rejected(error):
+    """503 (overloaded) or 429 (rate limited) for an admission.Rejected."""
+    message = "Too many requests, slow down" if isinstance(error, admission.RateLimited) else "Skin analysis is busy, try again shortly"
+    return Response({"error": message}, status=error.status, headers={"Retry-After": str(error.retry_after)})
+
+
+def _is_truthy(value):
+    return str(value or "").lower() in ("1", "true", "yes")
+
+
+def _use_reply_cache(request, data):
+    """A request can skip the reply cache with ``no_cache`` or ``Cache-Control: no-cache``."""
+    if _is_truthy(data.get("no_cache")):
+        return False
+    return "no-cache" not in request.headers.get("Cache-Control", "")
 
 
 
@@ -35,7 +115,9 @@ class UserLogin(APIView):
         password = request.data.get("password")
 
         try:
-            user = UserProfile.objects.get(username=username)
+            # Straight from the primary, never the profile cache: a changed
+            # password must stop working at once on every worker
+            user = UserProfile.objects.using("default").get(username=username)
             if user.password == password:
                 request.session["user_id"] = user.id
                 serializer = UserProfileSerializer(user)
@@ -57,12 +139,36 @@ class UserInfo(APIView):
             return Response({"error": "User not logged in"}, status=status.HTTP_401_UNAUTHORIZED)
 
         try:
-            user = UserProfile.objects.get(id=user_id)
+            user = profile_cache.get_profile(user_id)
             serializer = UserProfileSerializer(user)
             return Response({"user": serializer.data}, status=status.HTTP_200_OK)
         except UserProfile.DoesNotExist:
             return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
 
+class HealthRecordCursorPagination(CursorPagination):
+    # Keyset pagination over (user, created_at): every page is an index
+    # range scan, however deep the client has paged.
+    ordering = ("-created_at", "-id")
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class HealthRecordListView(generics.ListAPIView):
+    """A user's record history, newest first: /user/records/?cursor=..."""
+    serializer_class = HealthRecordListSerializer
+    pagination_class = HealthRecordCursorPagination
+
+    def get_queryset(self):
+        # Only ever the logged-in user's own history
+        user_id = self.request.session.get("user_id")
+        if not user_id:
+            raise NotAuthenticated("User not logged in")
+        return HealthRecord.objects.filter(user_id=user_id).select_related("asset").only(
+            "id", "message", "bot_response", "image", "created_at", "asset__sha256"
+        )
+
+
 class HealthRecordView(APIView):
     def post(self, request):
         user_id = request.data.get("user_id")
@@ -70,7 +176,7 @@ class HealthRecordView(APIView):
             return Response({"error": "Missing user ID"}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            user = UserProfile.objects.get(id=user_id)
+            user = profile_cache.get_profile(user_id)
         except UserProfile.DoesNotExist:
             return Response({"error": "Invalid user ID"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -78,141 +184,363 @@ class HealthRecordView(APIView):
         uploaded_image = request.FILES.get("image")
         city_name = user.address or "Ongole"
 
-        fallback_advice = (
-            "⚠️ The AI assistant is currently unavailable.\n\n"
-            "General suggestions:\n"
-            "1. Rest and drink plenty of water.\n"
-            "2. Use paracetamol for fever.\n"
-            "3. Try simple home remedies like honey with warm water for cough.\n"
-            "4. See a doctor if severe symptoms appear.\n\n"
-            "⚠️ This is not medical advice. Please consult a doctor."
-        )
+        if settings.BOT_ASYNC_MODE or _is_truthy(request.data.get("async")):
+            return self.enqueue(request, user, user_message, uploaded_image)
 
-        bot_reply = fallback_advice
-        groq_api_key = os.environ.get("GROQ_API_KEY", "")
-
-        if groq_api_key:
-            try:
-                messages = [
-                    {
-                        "role": "system",
-                        "content": (
-                            "You are a helpful health assistant. "
-                            "Always answer in very simple English with 4 parts:\n"
-                            "1. Cause explanation\n2. Home remedies\n3. Safe OTC medicines\n"
-                            "4. Advice to see a doctor if it worsens."
-                        ),
-                    }
-                ]
-
-                # ✅ If image provided, send as base64 to Groq
-                if uploaded_image:
-                    image_bytes = uploaded_image.read()
-                    image_b64 = base64.b64encode(image_bytes).decode("utf-8")
-                    messages.append(
-                        {"role": "user", "content": f"Skin image (base64): {image_b64}"}
-                    )
-                else:
-                    # Otherwise use text message
-                    messages.append({"role": "user", "content": f"My symptoms: {user_message}"})
-
-                groq_res = requests.post(
-                    "https://api.groq.com/openai/v1/chat/completions",
-                    json={
-                        "model": "llama-3.1-8b-instant",
-                        "messages": messages,
-                        "max_tokens": 400,
-                        "temperature": 0.6,
-                    },
-                    headers={
-                        "Authorization": f"Bearer {groq_api_key}",
-                        "Content-Type": "application/json",
-                    },
-                    timeout=30,
-                )
-                groq_res.raise_for_status()
-                choices = groq_res.json().get("choices", [])
-                if choices and "message" in choices[0]:
-                    bot_reply = choices[0]["message"].get("content", fallback_advice).strip()
-            except requests.RequestException as e:
-                print("Groq API error:", str(e))
-                bot_reply = fallback_advice
+        with metrics.stage("bot.reply"):
+            bot_reply = get_bot_reply(user_message, uploaded_image, _use_reply_cache(request, request.data))
 
         # --- Geoapify hospital search ---
-        hospitals = []
-        geoapify_api_key = os.environ.get("GEOAPIFY_API_KEY", "")
-        if geoapify_api_key:
-            try:
-                geo_res = requests.get(
-                    "https://api.geoapify.com/v1/geocode/search",
-                    params={"text": city_name, "apiKey": geoapify_api_key},
-                    timeout=10,
-                )
-                geo_res.raise_for_status()
-                features = geo_res.json().get("features", [])
-                if features:
-                    lat, lon = features[0]["geometry"]["coordinates"][1], features[0]["geometry"]["coordinates"][0]
-                    places_res = requests.get(
-                        "https://api.geoapify.com/v2/places",
-                        params={
-                            "categories": "healthcare.hospital",
-                            "bias": f"proximity:{lon},{lat}",
-                            "limit": 5,
-                            "apiKey": geoapify_api_key,
-                        },
-                        timeout=10,
-                    )
-                    places_res.raise_for_status()
-                    hospitals = [
-                        {
-                            "name": f["properties"].get("name", "Unnamed"),
-                            "address": f["properties"].get("formatted", "Address not available"),
-                            "lat": f["properties"].get("lat"),
-                            "lon": f["properties"].get("lon"),
-                            "map_link": f"https://www.google.com/maps/search/?api=1&query={f['properties'].get('lat')},{f['properties'].get('lon')}"
-                        }
-                        for f in places_res.json().get("features", [])
-                    ]
-            except requests.RequestException:
-                hospitals = [{"error": "Unable to fetch hospitals at this time."}]
-
-        
+        with metrics.stage("bot.hospitals"):
+            hospitals = find_hospitals(city_name)
+
+        with metrics.stage("bot.store_image"):
+            asset = _stored_asset(uploaded_image)
+        with metrics.stage("bot.db_insert"):
+            record = HealthRecord.objects.create(
+                user=user,
+                message=user_message,
+                bot_response=bot_reply,
+                asset=asset
+            )
+
+        with metrics.stage("bot.serialize"):
+            data = {
+                "record": HealthRecordSerializer(record).data,
+                "suggested_hospitals": hospitals,
+            }
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    def enqueue(self, request, user, user_message, uploaded_image):
+        """Save a pending record, queue the Groq/Geoapify work, answer 202."""
+        max_depth = settings.BOT_QUEUE_MAX_DEPTH
+        if max_depth and jobs.queue_depth() >= max_depth:
+            return Response(
+                {"error": "Too many queued requests, try again shortly"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "5"},
+            )
+
         record = HealthRecord.objects.create(
             user=user,
             message=user_message,
-            bot_response=bot_reply
+            asset=_stored_asset(uploaded_image)
         )
-
+        job = jobs.enqueue(record, use_cache=_use_reply_cache(request, request.data))
         return Response(
             {
-                "record": HealthRecordSerializer(record).data,
-                "suggested_hospitals": hospitals,
+                "job_id": job.id,
+                "status": job.status,
+                "status_url": reverse("bot-job-status", args=[job.id]),
             },
-            status=status.HTTP_201_CREATED
+            status=status.HTTP_202_ACCEPTED
         )
+
+
+class BotJobStatusView(APIView):
+    """
+    Poll a queued bot request; once done the body matches /user/bot/'s.
+    Only the logged-in owner of the job's record can see it.
+    """
+    def get(self, request, job_id):
+        user_id = request.session.get("user_id")
+        if not user_id:
+            return Response({"error": "User not logged in"}, status=status.HTTP_401_UNAUTHORIZED)
+        try:
+            job = BotJob.objects.select_related("record__user", "record__asset").get(
+                id=job_id, record__user_id=user_id
+            )
+        except BotJob.DoesNotExist:
+            # Someone else's job looks the same as a missing one
+            return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        body = {"job_id": job.id, "status": job.status, "attempts": job.attempts}
+        if job.status == BotJob.DONE:
+            body["record"] = HealthRecordSerializer(job.record).data
+            body["suggested_hospitals"] = job.suggested_hospitals
+        elif job.status == BotJob.FAILED:
+            body["error"] = job.error
+        return Response(body)
+
+
+def _sse(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+class HealthRecordStreamView(APIView):
+    """
+    Streaming variant of HealthRecordView. Reply tokens are relayed as
+    server-sent events (``data: {"token": ...}``) as soon as Groq produces
+    them; once the reply is complete the HealthRecord is saved and a final
+    ``done`` event carries the same body HealthRecordView returns.
+
+    Under ASGI the events come from an async generator: Django would read a
+    plain generator to the end before sending anything.
+    """
+    def post(self, request):
+        user_id = request.data.get("user_id")
+        if not user_id:
+            return Response({"error": "Missing user ID"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            user = profile_cache.get_profile(user_id)
+        except UserProfile.DoesNotExist:
+            return Response({"error": "Invalid user ID"}, status=status.HTTP_404_NOT_FOUND)
+
+        user_message = request.data.get("message", "")
+        uploaded_image = request.FILES.get("image")
+        city_name = user.address or "Ongole"
+        use_cache = _use_reply_cache(request, request.data)
+
+        def done(record, hospitals):
+            return _sse(
+                {
+                    "record": HealthRecordSerializer(record).data,
+                    "suggested_hospitals": hospitals,
+                },
+                event="done",
+            )
+
+        def events():
+            pieces = []
+            for token in stream_bot_reply(user_message, uploaded_image, use_cache):
+                pieces.append(token)
+                yield _sse({"token": token})
+
+            hospitals = find_hospitals(city_name)
+            record = HealthRecord.objects.create(
+                user=user,
+                message=user_message,
+                bot_response="".join(pieces).strip(),
+                asset=_stored_asset(uploaded_image)
+            )
+            yield done(record, hospitals)
+
+        async def aevents():
+            pieces = []
+            async for token in astream_bot_reply(user_message, uploaded_image, use_cache):
+                pieces.append(token)
+                yield _sse({"token": token})
+
+            hospitals = await afind_hospitals(city_name)
+            record = await HealthRecord.objects.acreate(
+                user=user,
+                message=user_message,
+                bot_response="".join(pieces).strip(),
+                asset=await sync_to_async(_stored_asset)(uploaded_image)
+            )
+            yield done(record, hospitals)
+
+        body = aevents() if isinstance(request._request, ASGIRequest) else events()
+        response = StreamingHttpResponse(body, content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # don't let nginx buffer the stream
+        return response
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class HealthRecordAsyncView(View):
+    """
+    Async variant of HealthRecordView for ASGI deployments (asgi.py). The
+    Groq reply and the hospital lookup run concurrently, so latency is the
+    slower of the two instead of their sum, and a waiting request does not
+    pin a worker thread. The record is saved once both have finished.
+    """
+    async def post(self, request):
+        if request.content_type == "application/json":
+            try:
+                data = json.loads(request.body or b"{}")
+            except ValueError:
+                return JsonResponse({"error": "Invalid JSON"}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            data = request.POST
+
+        user_id = data.get("user_id")
+        if not user_id:
+            return JsonResponse({"error": "Missing user ID"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            user = await profile_cache.aget_profile(user_id)
+        except (UserProfile.DoesNotExist, ValueError):
+            return JsonResponse({"error": "Invalid user ID"}, status=status.HTTP_404_NOT_FOUND)
+
+        user_message = data.get("message", "")
+        uploaded_image = request.FILES.get("image")
+        city_name = user.address or "Ongole"
+
+        bot_reply, hospitals = await asyncio.gather(
+            metrics.astage("bot.reply", aget_bot_reply(user_message, uploaded_image, _use_reply_cache(request, data))),
+            metrics.astage("bot.hospitals", afind_hospitals(city_name)),
+        )
+
+        with metrics.stage("bot.store_image"):
+            asset = await sync_to_async(_stored_asset)(uploaded_image)
+        with metrics.stage("bot.db_insert"):
+            record = await HealthRecord.objects.acreate(
+                user=user,
+                message=user_message,
+                bot_response=bot_reply,
+                asset=asset
+            )
+
+        with metrics.stage("bot.serialize"):
+            data = {
+                "record": HealthRecordSerializer(record).data,
+                "suggested_hospitals": hospitals,
+            }
+        return JsonResponse(data, status=status.HTTP_201_CREATED)
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.core.files.storage import default_storage
-from .cnn_model import predict_skin_disease
+from PIL import UnidentifiedImageError
+from django.conf import settings
+from .cnn_model import predict_skin_diseases
+from .preprocessing import preprocess_images
+from .inference import InferenceUnavailable
+from . import prediction_cache
 
 class SkinDiseasePredictionView(APIView):
     """
     Predict skin disease from an uploaded image and return detailed info.
+    Instead of re-uploading, ``asset`` may name a stored image of the
+    logged-in user's by its SHA-256; its model-sized copy is used once built.
     """
     def post(self, request, format=None):
-        if 'image' not in request.FILES:
+        sha256 = request.data.get("asset")
+        if 'image' not in request.FILES and not sha256:
             return Response({"error": "No image uploaded"}, status=400)
 
-        # Save uploaded image temporarily
-        image_file = request.FILES['image']
-        path = default_storage.save(f"temp/{image_file.name}", image_file)
-        full_path = default_storage.path(path)
-
         try:
-            # Get prediction
-            result = predict_skin_disease(full_path)
-        finally:
-            # Delete temporary file
-            default_storage.delete(path)
+            admission.check_skin_rate(_client_key(request))
+            if 'image' in request.FILES:
+                # Decode straight from the upload, no temp file
+                result = prediction_cache.cached_predict_skin_disease(request.FILES['image'])
+            else:
+                with metrics.stage("skin.load_asset"):
+                    asset = _owned_asset(request, sha256)
+                    image_file = image_store.inference_file(asset).open("rb")
+                with image_file:
+                    result = prediction_cache.cached_predict_skin_disease(image_file, digest=asset.sha256)
+        except UnidentifiedImageError:
+            return Response({"error": "Invalid image"}, status=400)
+        except InferenceUnavailable:
+            return Response({"error": "Skin analysis is busy, try again shortly"}, status=503, headers={"Retry-After": "5"})
+        except admission.Rejected as e:
+            return _rejected(e)
 
         return Response(result)
+
+
+class SkinDiseaseBatchPredictionView(APIView):
+    """
+    Predict several uploaded images (repeated ``image`` fields) in one
+    forward pass. Results come back in upload order, each shaped like the
+    single-image response, or ``{"error": ...}`` for an unreadable image.
+    """
+    def post(self, request, format=None):
+        images = request.FILES.getlist('image')
+        if not images:
+            return Response({"error": "No image uploaded"}, status=400)
+        max_images = settings.SKIN_BATCH_MAX_IMAGES
+        if len(images) > max_images:
+            return Response({"error": f"At most {max_images} images per request"}, status=400)
+
+        results = [None] * len(images)
+        arrays, positions = [], []
+        try:
+            # Each image counts against the rate limit; decoding and the
+            # forward pass share one admission slot
+            admission.check_skin_rate(_client_key(request), cost=len(images))
+            with admission.skin_inference():
+                with metrics.stage("skin.preprocess"):
+                    items = preprocess_images(images)
+                for i, item in enumerate(items):
+                    if isinstance(item, UnidentifiedImageError):
+                        results[i] = {"error": "Invalid image"}
+                    elif isinstance(item, Exception):
+                        results[i] = {"error": "Could not process image"}
+                    else:
+                        arrays.append(item)
+                        positions.append(i)
+                predictions = predict_skin_diseases(arrays)
+        except InferenceUnavailable:
+            return Response({"error": "Skin analysis is busy, try again shortly"}, status=503, headers={"Retry-After": "5"})
+        except admission.Rejected as e:
+            return _rejected(e)
+        for i, result in zip(positions, predictions):
+            results[i] = result
+
+        return Response({"results": results})
+
+
+class SkinPredictionCacheStatsView(APIView):
+    """Hit/miss counters for this worker's skin prediction cache."""
+    def get(self, request, format=None):
+        counters = prediction_cache.stats.snapshot()
+        hits = counters["exact_hits"] + counters["perceptual_hits"]
+        lookups = hits + counters["misses"]
+        counters["hit_ratio"] = hits / lookups if lookups else 0.0
+        return Response(counters)
+
+
+class ImageAssetView(View):
+    """
+    GET /user/images/<sha256>/<original|thumbnail|model>/, for the logged-in
+    owner of a record with that image only; anyone else gets 404. Content
+    never changes for a given URL, so built variants are cached for a year
+    (by the browser only, as images are private); a variant that is not
+    built yet is answered with the original, briefly.
+    """
+    def get(self, request, sha256, variant):
+        user_id = request.session.get("user_id")
+        if not user_id:
+            return JsonResponse({"error": "User not logged in"}, status=401)
+        if variant not in image_store.VARIANTS:
+            raise Http404("Unknown variant")
+        asset = _owned_asset(request, sha256)
+        field, content_type, final = image_store.variant_file(asset, variant)
+
+        etag = f'"{sha256}-{variant if final else "original"}"'
+        if etag in request.headers.get("If-None-Match", ""):
+            response = HttpResponseNotModified()
+        else:
+            response = FileResponse(field.open("rb"), content_type=content_type)
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, max-age=31536000" if final else "private, max-age=60"
+        return response
+
+
+class HealthRecordExportView(APIView):
+    """
+    Admin-only dump of health records with their user's profile fields:
+    GET /user/export/?output=ndjson|csv&since=2026-10-01&until=2026-10-18&gzip=1
+
+    ``since``/``until`` are ISO dates or datetimes (both inclusive). Rows are
+    streamed from a database cursor, so the response can be any size.
+    (``output`` rather than ``format``, which DRF reserves for renderers.)
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        fmt = request.query_params.get("output", "ndjson")
+        if fmt not in export.FORMATS:
+            return Response({"error": f"output must be one of {', '.join(export.FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            since = export.parse_bound(request.query_params.get("since"))
+            until = export.parse_bound(request.query_params.get("until"), end=True)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        compress = _is_truthy(request.query_params.get("gzip"))
+
+        content_type, extension = export.FORMATS[fmt]
+        filename = f"health-records{extension}"
+        if compress:
+            content_type, filename = "application/gzip", filename + ".gz"
+        body = export.stream(export.records(since, until), fmt, compress=compress)
+        if isinstance(request._request, ASGIRequest):
+            body = export.aiterate(body)
+        response = StreamingHttpResponse(body, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        response["Cache-Control"] = "no-store"
+        response["X-Accel-Buffering"] = "no"
+        return response